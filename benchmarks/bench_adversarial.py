@@ -0,0 +1,115 @@
+"""
+Worst-case render time over adversarial and fuzzed Markdown.
+
+Renders a corpus of pathological inputs (long runs of backticks, deeply nested
+lists and blockquotes, huge link counts, unbalanced emphasis, ...) at growing
+sizes, plus random strings of Markdown metacharacters. Every input is rendered
+under the render budget, so a runaway input is cut off at --timeout instead of
+hanging the benchmark.
+
+Exits with status 1 when any input blocks for longer than --max-ms (i.e. the
+budget isn't enforced), or when more than --max-timeouts inputs run out of
+time (i.e. the pipeline got slower), so it can guard against regressions in CI.
+
+Usage (with the project installed, see README):
+    python benchmarks/bench_adversarial.py [--timeout S] [--max-ms MS]
+        [--max-timeouts N] [--fuzz N]
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+from dailypush import constants
+from dailypush.rendering import RenderTimeout, render_pool
+
+ADVERSARIAL = {
+    "backticks": lambda n: "`" * n,
+    "nested_lists": lambda n: "".join("    " * i + "- item\n" for i in range(n // 4)),
+    "nested_quotes": lambda n: ">" * n + " deep",
+    "nested_brackets": lambda n: "[" * n + "]" * n,
+    "unbalanced_emphasis": lambda n: "*a **b _c " * n,
+    "many_links": lambda n: " ".join(f"http://e{i}.example.com" for i in range(n)),
+    "reference_links": lambda n: "".join(f"[l{i}]: http://x{i}.com\n" for i in range(n))
+    + "".join(f"\n[a][l{i}]" for i in range(n)),
+    "unclosed_html": lambda n: "<div><span>" * n,
+    "entities": lambda n: "&amp;&#x27;&lt;" * n,
+    "long_line": lambda n: "word " * (n * 20),
+}
+SIZES = (50, 200, 800, 3200)
+METACHARACTERS = "*_`[]()<>!#>-+=|\\\n \t&;:/.0123456789abcxyz"
+
+
+def fuzz_corpus(count, length, seed=0):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(METACHARACTERS) for _ in range(rng.randint(1, length)))
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--timeout", type=float, default=1.0, help="render budget")
+    parser.add_argument(
+        "--max-ms", type=float, help="defaults to the budget plus 500 ms"
+    )
+    parser.add_argument("--max-timeouts", type=int)
+    parser.add_argument("--fuzz", type=int, default=300, help="number of fuzz inputs")
+    parser.add_argument("--fuzz-length", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = [
+        (f"{name}[{size}]", make(size))
+        for name, make in ADVERSARIAL.items()
+        for size in SIZES
+    ]
+    corpus += [
+        (f"fuzz[{i}]", body)
+        for i, body in enumerate(fuzz_corpus(args.fuzz, args.fuzz_length))
+    ]
+
+    max_ms = args.max_ms or args.timeout * 1000 + 500
+    # budget warnings would drown the report
+    logging.getLogger("dailypush.rendering").setLevel(logging.ERROR)
+
+    render_pool.processes = 1
+    results = []
+    timeouts = 0
+    try:
+        for name, body in corpus:
+            if len(body) > constants.RENDER_MAX_BODY_SIZE:
+                # never rendered as Markdown in the app
+                continue
+            start = time.perf_counter()
+            try:
+                render_pool.render(body, args.timeout)
+            except RenderTimeout:
+                timeouts += 1
+                name += " (timeout)"
+            results.append(((time.perf_counter() - start) * 1000, name, len(body)))
+    finally:
+        render_pool.terminate()
+
+    results.sort(reverse=True)
+    print(f"{len(results)} inputs, {timeouts} over the {args.timeout}s budget.")
+    print("Slowest:")
+    for ms, name, length in results[:10]:
+        print(f"  {ms:9.1f} ms  {name:<38} {length:>8} chars")
+
+    worst = results[0][0]
+    failed = False
+    if worst > max_ms:
+        print(f"FAIL: worst case {worst:.1f} ms exceeds {max_ms:.1f} ms")
+        failed = True
+    if args.max_timeouts is not None and timeouts > args.max_timeouts:
+        print(f"FAIL: {timeouts} inputs over budget, more than {args.max_timeouts}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"OK: worst case {worst:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Microbenchmark of dailypush.utils.multireplace on large HTML inputs.
+
+Compares the previous implementation (compiling the regex on every call and
+lower-casing every match) with the thin multireplace wrapper and with a
+precompiled Replacer, using the heading replacements applied to every post.
+
+Usage (with the project installed, see README):
+    python benchmarks/bench_multireplace.py [--size KIB] [--number N]
+"""
+import argparse
+import re
+import timeit
+
+from dailypush.rendering import HEADING_REPLACEMENTS
+from dailypush.utils import Replacer, multireplace
+
+
+def legacy_multireplace(string, replacements, ignore_case=False):
+    """multireplace as it was before Replacer existed."""
+    if not replacements:
+        return string
+
+    if ignore_case:
+
+        def normalize_old(s):
+            return s.lower()
+
+        re_mode = re.IGNORECASE
+
+    else:
+
+        def normalize_old(s):
+            return s
+
+        re_mode = 0
+
+    replacements = {normalize_old(key): val for key, val in replacements.items()}
+    rep_sorted = sorted(replacements, key=len, reverse=True)
+    rep_escaped = map(re.escape, rep_sorted)
+    pattern = re.compile("|".join(rep_escaped), re_mode)
+    return pattern.sub(
+        lambda match: replacements[normalize_old(match.group(0))], string
+    )
+
+
+def html_document(size_kib):
+    """Build HTML similar to converted posts, with plenty of headings."""
+    section = (
+        "<h1>Title</h1>\n<p>Some <em>text</em> in a paragraph.</p>\n"
+        "<H2>Section</H2>\n<ul>\n<li>item</li>\n<li>item</li>\n</ul>\n"
+        "<h3>Subsection</h3>\n<pre><code>code = 1\n</code></pre>\n"
+        "<h6>Minor</h6>\n<blockquote>\n<p>quote</p>\n</blockquote>\n"
+    )
+    return section * (size_kib * 1024 // len(section) + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=1024, help="input size in KiB")
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    for size in (1, 64, args.size):
+        html = html_document(size)
+        # scale repetitions, so small inputs measure the per-call overhead
+        number = args.number * max(1, args.size // size)
+        replacer = Replacer(HEADING_REPLACEMENTS, ignore_case=True)
+        expected = legacy_multireplace(html, HEADING_REPLACEMENTS, True)
+        assert replacer.replace(html) == expected
+
+        candidates = {
+            "legacy": lambda: legacy_multireplace(html, HEADING_REPLACEMENTS, True),
+            "multireplace": lambda: multireplace(html, HEADING_REPLACEMENTS, True),
+            "Replacer": lambda: replacer.replace(html),
+        }
+        print(f"input {size} KiB, {number} calls:")
+        for name, func in candidates.items():
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            print(f"  {name:>12}: {seconds / number * 1e6:10.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
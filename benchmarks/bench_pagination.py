@@ -0,0 +1,127 @@
+"""
+Topic page latency by page depth, with exact-count and keyset pagination.
+
+Seeds a SQLite database with one topic of --posts posts (1M by default; seeding
+takes a while, so the database is kept and reused between runs), then requests
+pages of the topic at growing depths through the test client, in both
+TOPIC_PAGINATION modes. With keyset pagination, latency should stay flat across
+depths, while page numbers with OFFSET and COUNT(*) get linearly slower.
+
+Usage (with the project installed, see README):
+    python benchmarks/bench_pagination.py [--posts N] [--db PATH] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import generate_password_hash
+
+from dailypush import constants, create_app, db, init_db
+from dailypush.models import Post, Topic, User
+from dailypush.pagination import encode_cursor
+
+
+def seed(posts):
+    init_db()
+    db.session.add(User(id=1, username="bench", hash=generate_password_hash("x")))
+    db.session.add(Topic(id=1, name="bench", author_id=1, created=datetime(2000, 1, 1)))
+    db.session.commit()
+
+    table = Post.__table__
+    start = datetime(2000, 1, 1)
+    chunk = 50_000
+    for offset in range(0, posts, chunk):
+        db.session.execute(
+            table.insert(),
+            [
+                {
+                    "id": i + 1,
+                    "topic_id": 1,
+                    "title": f"post {i}",
+                    "body": "body",
+                    "body_html": "<p>body</p>",
+                    "created": start + timedelta(minutes=i),
+                }
+                for i in range(offset, min(offset + chunk, posts))
+            ],
+        )
+        db.session.commit()
+        print(f"  seeded {min(offset + chunk, posts)} posts", end="\r")
+    print()
+
+
+def is_seeded(posts):
+    """Whether the database has the seeded posts, with the current schema."""
+    try:
+        db.session.execute(db.select(Post).limit(1)).all()
+        return db.session.scalar(db.select(db.func.count(Post.id))) == posts
+    except OperationalError:
+        db.session.rollback()
+        return False
+
+
+def keyset_url(depth):
+    """URL of the page at depth, as reached by following "Older" links."""
+    if depth == 1:
+        return "/topics/1"
+    offset = (depth - 1) * constants.POSTS_PER_TOPIC_PAGE - 1
+    select = (
+        db.select(Post.created, Post.id)
+        .filter_by(topic_id=1)
+        .order_by(Post.created.desc(), Post.id.desc())
+        .offset(offset)
+        .limit(1)
+    )
+    row = db.session.execute(select).one()
+    return f"/topics/1?after={encode_cursor(row.created, row.id)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--db", help="SQLite database file, kept between runs")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(
+        tempfile.gettempdir(), f"dailypush-bench-{args.posts}.sqlite"
+    )
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}"})
+    with app.app_context():
+        if not is_seeded(args.posts):
+            print(f"seeding {path}")
+            seed(args.posts)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+
+    pages = args.posts // constants.POSTS_PER_TOPIC_PAGE
+    depths = {1, 10, 100, 1000, 10_000, pages // 2, pages}
+    depths = sorted(depth for depth in depths if 1 <= depth <= pages)
+    print(f"{'depth':>8} {'count (ms)':>12} {'keyset (ms)':>12}")
+    for depth in depths:
+        timings = {}
+        for mode in ("count", "keyset"):
+            app.config["TOPIC_PAGINATION"] = mode
+            if mode == "count":
+                url = f"/topics/1?page={depth}"
+            else:
+                with app.app_context():
+                    url = keyset_url(depth)
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = client.get(url)
+                samples.append(time.perf_counter() - start)
+                assert response.status_code == 200
+            timings[mode] = statistics.median(samples) * 1000
+        print(f"{depth:>8} {timings['count']:>12.1f} {timings['keyset']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Throughput benchmark for the post rendering pipeline.
+
+Renders a corpus of posts with dailypush.rendering and with the previous
+implementation (new Markdown, Cleaner and Linker objects per post), and reports
+posts per second with median and p99 render times.
+
+Usage (with the project installed, see README):
+    python benchmarks/bench_rendering.py [--corpus DIR] [--posts N] [--rounds N]
+
+DIR should contain Markdown files (e.g. an export of real posts). Without it,
+a synthetic corpus of short, medium and long posts is generated.
+"""
+import argparse
+import os
+import random
+
+import bleach
+from markdown import markdown
+
+from dailypush import constants
+from dailypush.rendering import HEADING_REPLACEMENTS, benchmark, render_body
+from dailypush.utils import multireplace
+
+PARAGRAPH = (
+    "Lorem ipsum dolor sit amet, *consectetur* adipiscing elit, sed do "
+    "**eiusmod** tempor incididunt ut labore et `dolore` magna aliqua. "
+    "See https://example.com/page?id={n} or [the docs](https://docs.example.com/{n})."
+)
+BLOCKS = (
+    "# Heading {n}",
+    "### Subheading {n}",
+    PARAGRAPH,
+    PARAGRAPH,
+    "- item one\n- item {n}\n    - nested item\n- item three",
+    "1. first\n2. second\n3. third {n}",
+    "> A quoted line {n}\n> and another one",
+    "    def code_block_{n}():\n        return {n}",
+    "<b>inline</b> html that gets <script>stripped</script> {n}",
+    "---",
+)
+
+
+def synthetic_corpus(posts, seed=0):
+    """Generate posts of 1 to 60 blocks, skewed towards shorter ones."""
+    rng = random.Random(seed)
+    corpus = []
+    for n in range(posts):
+        blocks = int(rng.paretovariate(1.2)) % 60 + 1
+        corpus.append(
+            "\n\n".join(rng.choice(BLOCKS).format(n=n) for _ in range(blocks))
+        )
+    return corpus
+
+
+def load_corpus(directory):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def legacy_render_body(value):
+    """The rendering pipeline before dailypush.rendering existed."""
+    body_html = markdown(value, output_format="html")
+    body_html = multireplace(body_html, HEADING_REPLACEMENTS, ignore_case=True)
+    return bleach.linkify(
+        bleach.clean(body_html, tags=list(constants.ALLOWED_TAGS), strip=True)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", help="directory with Markdown files")
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.posts)
+    print(f"corpus: {len(corpus)} posts, {sum(map(len, corpus)) / 1024:.0f} KiB")
+    for name, render in (("legacy", legacy_render_body), ("rendering", render_body)):
+        # warm up imports, thread-local instances and regex caches
+        benchmark(corpus[:10], render=render)
+        result = benchmark(corpus, rounds=args.rounds, render=render)
+        print(
+            f"{name:>10}: {result['posts_per_sec']:8.0f} posts/s"
+            f"  p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
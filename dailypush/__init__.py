@@ -14,8 +14,11 @@ from flask_admin.menu import MenuLink
 from flask_moment import Moment
 from flask_pagedown import PageDown
 
+from dailypush import constants
+from dailypush.routing import RoutingSession
 
-db = SQLAlchemy()
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 moment = Moment()
 pagedown = PageDown()
@@ -47,6 +50,63 @@ def create_app(test_config=None):
         SQLALCHEMY_ECHO=False,
         # set optional Bootswatch theme for Flask-Admin
         FLASK_ADMIN_SWATCH="darkly",
+        # number of rendered post bodies kept in memory (0 disables the cache)
+        RENDER_CACHE_SIZE=constants.RENDER_CACHE_SIZE,
+        # render posts while saving them ("sync"), or later in a background thread
+        #   pool ("thread") or a separate `flask render-worker` process ("worker")
+        RENDER_MODE="sync",
+        # size of the "thread" mode pool (0 renders right after each commit)
+        RENDER_THREADS=1,
+        # longer post bodies are shown as plain text instead of rendered Markdown
+        RENDER_MAX_BODY_SIZE=constants.RENDER_MAX_BODY_SIZE,
+        # seconds a single post may take to render, after which it's shown as plain
+        #   text (None renders in the calling thread, without a time limit)
+        RENDER_TIMEOUT=None,
+        # number of worker processes for renders with a time limit
+        RENDER_PROCESSES=constants.RENDER_PROCESSES,
+        # paginate topic pages by page number, with exact post count ("count"),
+        #   or with a cursor, which keeps deep pages fast ("keyset")
+        TOPIC_PAGINATION="count",
+        # seconds after which the home page's feed of recent posts is rebuilt, to
+        #   pick up changes made by other processes (None only rebuilds it when
+        #   this process changes posts or topics)
+        RECENT_POSTS_TTL=60,
+        # number of logged in users kept in memory between requests (0 loads the
+        #   user on every request), and seconds after which they're reloaded
+        USER_CACHE_SIZE=constants.USER_CACHE_SIZE,
+        USER_CACHE_TTL=60,
+        # measure SQL queries of each request (Server-Timing header and a log line)
+        SQL_INSTRUMENTATION=False,
+        # statements repeated this many times in a request are logged as possible N+1
+        SQL_REPEATED_QUERY_THRESHOLD=5,
+        # keys of SQLALCHEMY_BINDS which are read-only replicas of the database,
+        #   used for reads while handling GET requests
+        DATABASE_REPLICAS=[],
+        # seconds a visitor keeps reading from the primary after writing to it
+        DATABASE_REPLICA_STICKINESS=5,
+        # admin lists with more rows show an estimate (e.g. "10,000+") instead of
+        #   counting all of them (None always counts exactly)
+        ADMIN_EXACT_COUNT_LIMIT=constants.ADMIN_EXACT_COUNT_LIMIT,
+        # cache whole pages for visitors who aren't logged in, in the memory of each
+        #   process ("memory"), in files shared by all processes ("filesystem"),
+        #   or not at all (None)
+        PAGE_CACHE="memory",
+        # number of cached pages, and seconds after which they're rendered again,
+        #   to pick up changes made by other processes
+        PAGE_CACHE_SIZE=constants.PAGE_CACHE_SIZE,
+        PAGE_CACHE_TTL=60,
+        # directory of the "filesystem" page cache (None puts it in the instance
+        #   folder)
+        PAGE_CACHE_DIR=None,
+        # number of rendered template fragments (e.g. posts) kept in memory
+        #   (0 disables the cache)
+        FRAGMENT_CACHE_SIZE=constants.FRAGMENT_CACHE_SIZE,
+        # serve the minified and precompressed static files built by
+        #   `flask build-assets`, if they were built
+        BUILT_ASSETS=True,
+        # send topic and home pages while they're rendered, compressed on the fly
+        #   if the browser accepts it, instead of rendering them in full first
+        STREAM_PAGES=False,
     )
 
     if test_config is None:
@@ -88,8 +148,36 @@ def create_app(test_config=None):
     moment.init_app(app)
     pagedown.init_app(app)
 
-    from dailypush import auth, blog, filters
+    from dailypush import (
+        assets,
+        auth,
+        blog,
+        commands,
+        feed,
+        filters,
+        fragment_cache,
+        instrumentation,
+        page_cache,
+        render_queue,
+        search,
+    )
     from dailypush.models import User, Topic, Post
+    from dailypush.rendering import render_cache, render_pool
+
+    render_cache.resize(app.config["RENDER_CACHE_SIZE"])
+    render_pool.processes = app.config["RENDER_PROCESSES"]
+    app.jinja_env.add_extension(fragment_cache.FragmentCacheExtension)
+    app.cli.add_command(commands.rerender_posts_command)
+    app.cli.add_command(commands.render_worker_command)
+    app.cli.add_command(commands.recount_topics_command)
+    app.cli.add_command(commands.purge_deleted_command)
+    app.cli.add_command(commands.export_command)
+    app.cli.add_command(commands.import_command)
+    app.cli.add_command(commands.reindex_search_command)
+    app.cli.add_command(commands.build_assets_command)
+    assets.init_app(app)
+    # before the blueprints, so their request hooks are measured too
+    instrumentation.init_app(app)
 
     # apply the blueprints to the app
     app.register_blueprint(auth.bp)
@@ -126,8 +214,9 @@ def create_app(test_config=None):
 
 def init_db():
     """Clear the existing data and create new tables."""
-    db.drop_all()
-    db.create_all()
+    # only in the primary database, replicas get them through replication
+    db.drop_all(bind_key=None)
+    db.create_all(bind_key=None)
 
 
 @click.command("init-db")
@@ -0,0 +1,338 @@
+"""
+This module builds static files for production, and serves the built files.
+
+`flask build-assets` minifies the files of the static folder into static/build,
+with a hash of their content in their names (e.g. style.3f2a1b4c5d6e.css), along
+with gzipped copies (.gz) and, if the brotli package is installed, brotli ones
+(.br). The built names are recorded in static/build/manifest.json.
+
+Once the manifest exists (and BUILT_ASSETS is enabled), url_for("static",
+filename="style.css") points at the built file. The name of a built file changes
+with its content, so browsers are told to cache it for good, and never revalidate
+it. Browsers accepting gzip or brotli get the precompressed copy.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+from dailypush import constants
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Subfolder of the static folder with the built files, and their manifest
+BUILD_DIR = "build"
+MANIFEST_NAME = "manifest.json"
+# Precompressed copies, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Only text is worth compressing
+_COMPRESSED_EXTENSIONS = {".css", ".js", ".svg"}
+
+
+# JavaScript: a "/" after one of these starts a regular expression, not a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {
+    "await",
+    "case",
+    "delete",
+    "do",
+    "else",
+    "in",
+    "instanceof",
+    "new",
+    "of",
+    "return",
+    "throw",
+    "typeof",
+    "void",
+    "yield",
+}
+
+
+def _add_space(out, newline):
+    """Separate tokens with one space, or a line break if there was one."""
+    if not out:
+        return
+    if out[-1] in (" ", "\n"):
+        if newline:
+            out[-1] = "\n"
+        return
+    out.append("\n" if newline else " ")
+
+
+def _skip_string(source, start):
+    """Return the index after the string or template literal starting at start."""
+    quote = source[start]
+    i = start + 1
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if char == "\n" and quote != "`":
+            # unterminated, leave the rest to the browser
+            return i
+        i += 1
+    return len(source)
+
+
+def _skip_regex(source, start):
+    """Return the index after the regular expression literal starting at start."""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "\n":
+            return i
+        if in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "/":
+            i += 1
+            break
+        i += 1
+    # flags
+    while i < len(source) and (source[i].isalnum() or source[i] == "_"):
+        i += 1
+    return i
+
+
+def _regex_allowed(out):
+    """Whether a "/" following the tokens in out starts a regular expression."""
+    i = len(out) - 1
+    while i >= 0 and out[i] in (" ", "\n"):
+        i -= 1
+    if i < 0:
+        return True
+    if len(out[i]) > 1:
+        # a string or regular expression literal
+        return False
+    if out[i] in _REGEX_PRECEDERS:
+        return True
+    word = []
+    while i >= 0 and len(out[i]) == 1 and (out[i].isalnum() or out[i] in "_$"):
+        word.append(out[i])
+        i -= 1
+    return "".join(reversed(word)) in _REGEX_KEYWORDS
+
+
+def minify_js(source):
+    """
+    Minify JavaScript conservatively: drop comments and indentation, and collapse
+    other whitespace. Line breaks are kept, since automatic semicolon insertion
+    may depend on them, and strings and regular expressions are left as they are.
+    """
+    out = []
+    i = 0
+    while i < len(source):
+        char = source[i]
+        following = source[i + 1 : i + 2]
+        if char in "'\"`":
+            end = _skip_string(source, i)
+            out.append(source[i:end])
+        elif char == "/" and following == "/":
+            end = source.find("\n", i)
+            end = len(source) if end == -1 else end
+        elif char == "/" and following == "*":
+            end = source.find("*/", i + 2)
+            end = len(source) if end == -1 else end + 2
+            # a comment still separates tokens
+            _add_space(out, "\n" in source[i:end])
+        elif char == "/" and _regex_allowed(out):
+            end = _skip_regex(source, i)
+            out.append(source[i:end])
+        elif char.isspace():
+            end = i + 1
+            while end < len(source) and source[end].isspace():
+                end += 1
+            _add_space(out, "\n" in source[i:end])
+        else:
+            end = i + 1
+            out.append(char)
+        i = end
+    return "".join(out).strip() + "\n"
+
+
+_CSS_TOKEN_RE = re.compile(
+    r"""("(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')|(/\*.*?\*/|\s+)|([^"'/\s]+|/)""",
+    re.DOTALL,
+)
+# no space is needed next to these
+_CSS_PUNCTUATION = set("{};,>")
+
+
+def minify_css(source):
+    """Minify CSS: drop comments, and whitespace that doesn't separate tokens."""
+    out = []
+    space = False
+    for string, blank, text in _CSS_TOKEN_RE.findall(source):
+        if blank:
+            space = True
+            continue
+        token = string or text
+        if text == "}" and out and out[-1].endswith(";"):
+            # the last declaration needs no semicolon
+            out[-1] = out[-1][:-1]
+            if not out[-1]:
+                out.pop()
+        if (
+            space
+            and out
+            and out[-1][-1] not in _CSS_PUNCTUATION | {":"}
+            and token[0] not in _CSS_PUNCTUATION
+        ):
+            out.append(" ")
+        out.append(token)
+        space = False
+    return "".join(out) + "\n"
+
+
+_MINIFIERS = {".js": minify_js, ".css": minify_css}
+
+
+def _built_name(name, content):
+    """Return the name of a built file, e.g. "style.3f2a1b4c5d6e.css"."""
+    root, extension = posixpath.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[: constants.ASSET_HASH_LENGTH]
+    return posixpath.join(BUILD_DIR, f"{root}.{digest}{extension}")
+
+
+def build_assets(static_folder):
+    """
+    Build the files of the static folder into its build subfolder, and write
+    their manifest. Files of the previous build are kept, for pages rendered
+    before the new build is deployed, and older ones are removed.
+
+    Returns:
+        List of (name, built name, size, built size, gzipped size) of each file.
+    """
+    build_folder = os.path.join(static_folder, BUILD_DIR)
+    os.makedirs(build_folder, exist_ok=True)
+    manifest_path = os.path.join(build_folder, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = {}
+    results = []
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        if directory == static_folder and BUILD_DIR in subdirectories:
+            subdirectories.remove(BUILD_DIR)
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            extension = posixpath.splitext(name)[1]
+            with open(path, "rb") as f:
+                content = f.read()
+            size = len(content)
+            if extension in _MINIFIERS:
+                content = _MINIFIERS[extension](content.decode("utf-8")).encode()
+            built_name = _built_name(name, content)
+            built_path = os.path.join(static_folder, built_name)
+            os.makedirs(os.path.dirname(built_path), exist_ok=True)
+            with open(built_path, "wb") as f:
+                f.write(content)
+
+            gzipped_size = None
+            if extension in _COMPRESSED_EXTENSIONS:
+                # mtime=0 gives the same .gz for the same content
+                gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+                gzipped_size = len(gzipped)
+                with open(built_path + ".gz", "wb") as f:
+                    f.write(gzipped)
+                if brotli is not None:
+                    with open(built_path + ".br", "wb") as f:
+                        f.write(brotli.compress(content))
+            manifest[name] = built_name
+            results.append((name, built_name, size, len(content), gzipped_size))
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    keep = {
+        os.path.join(static_folder, built_name) + suffix
+        for built_name in (*manifest.values(), *previous.values())
+        for suffix in ("", ".gz", ".br")
+    }
+    keep.add(manifest_path)
+    for directory, subdirectories, filenames in os.walk(build_folder):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if path not in keep:
+                os.remove(path)
+    return results
+
+
+def get_manifest(app=None):
+    """Return the manifest of built files, empty if there are none to serve."""
+    app = app or current_app._get_current_object()
+    manifest = app.extensions.get("assets")
+    if manifest is None:
+        manifest = {}
+        if app.config["BUILT_ASSETS"]:
+            path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST_NAME)
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                pass
+        manifest = app.extensions.setdefault("assets", manifest)
+    return manifest
+
+
+def _url_for_built(endpoint, values):
+    """Point URLs of static files at their built version."""
+    if endpoint == "static" and "filename" in values:
+        values["filename"] = get_manifest().get(values["filename"], values["filename"])
+
+
+def send_static_file(filename):
+    """
+    Serve a static file. Built files are served precompressed, if the browser
+    accepts it, and cached for good.
+    """
+    if not filename.startswith(BUILD_DIR + "/") or filename.endswith(MANIFEST_NAME):
+        return current_app.send_static_file(filename)
+
+    static_folder = current_app.static_folder
+    max_age = constants.BUILT_ASSET_MAX_AGE
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(static_folder, filename + suffix)
+        if request.accept_encodings[encoding] and path and os.path.isfile(path):
+            response = send_from_directory(
+                static_folder,
+                filename + suffix,
+                mimetype=mimetypes.guess_type(filename)[0],
+                max_age=max_age,
+            )
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(static_folder, filename, max_age=max_age)
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    """Serve built static files in place of the originals, once they're built."""
+    app.url_defaults(_url_for_built)
+    if app.has_static_folder:
+        app.view_functions["static"] = send_static_file
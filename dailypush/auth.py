@@ -1,4 +1,5 @@
 import functools
+from collections import namedtuple
 
 from flask import (
     Blueprint,
@@ -13,11 +14,19 @@ from flask import (
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.exceptions import abort
 
-from flask_admin import AdminIndexView
-from flask_admin.contrib.sqla import ModelView
+from flask_admin import AdminIndexView, expose
+from flask_admin.contrib.sqla import ModelView, tools
+from flask_admin.contrib.sqla.filters import BaseSQLAFilter
+from sqlalchemy.orm import Query
 
 from dailypush import db, constants
-from dailypush.models import User
+from dailypush.models import User, Post, POST_EDITING
+from dailypush.fragment_cache import get_fragment_cache
+from dailypush.page_cache import get_page_cache
+from dailypush.purge import pending_deletions
+from dailypush.rendering import render_cache
+from dailypush.search import get_search_index
+from dailypush.utils import LRUCache
 from dailypush.forms import RegistrationForm, LoginForm
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
@@ -58,7 +67,9 @@ def login():
     """Log in a registered user by adding the user id to the session."""
     form = LoginForm()
     if form.validate_on_submit():
-        select = db.select(User).filter_by(username=form.username.data)
+        select = db.select(User).filter_by(
+            username=form.username.data, deleted_at=None
+        )
         user = db.session.execute(select).scalar()
         if user is not None and check_password_hash(user.hash, form.password.data):
             # store user id in a new session and return to index page
@@ -70,17 +81,71 @@ def login():
     return render_template("auth/login.html", form=form)
 
 
+# What most requests need to know about the logged in user, as stored in g.user.
+#   Views needing the User object itself get it from current_user().
+UserSnapshot = namedtuple("UserSnapshot", ["id", "username", "is_admin"])
+
+
+def _get_user_cache():
+    cache = current_app.extensions.get("user_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "user_cache",
+            LRUCache(
+                current_app.config["USER_CACHE_SIZE"],
+                ttl=current_app.config["USER_CACHE_TTL"],
+            ),
+        )
+    return cache
+
+
+def get_user_snapshot(user_id):
+    """
+    Return snapshot of the user with given id, or None if there's no such user.
+
+    Snapshots are cached per process for USER_CACHE_TTL seconds, so most requests
+    don't query the database for the logged in user.
+    """
+    cache = _get_user_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is None or user.deleted_at is not None:
+            return None
+        snapshot = UserSnapshot(
+            user.id,
+            user.username,
+            user.username == current_app.config["ADMIN_USERNAME"],
+        )
+        cache.set(user_id, snapshot)
+    return snapshot
+
+
+def invalidate_user(user_id):
+    """Drop cached snapshot of a changed or deleted user."""
+    _get_user_cache().pop(user_id)
+
+
 @bp.before_app_request
 def load_logged_in_user():
-    """If a user id is stored in the session, load user from database"""
+    """If a user id is stored in the session, load the user's snapshot."""
     user_id = session.get("user_id")
 
     if user_id is not None:
-        g.user = db.session.get(User, user_id)
+        g.user = get_user_snapshot(user_id)
     else:
         g.user = None
 
 
+def current_user():
+    """Return the logged in user as a User object, or None if not logged in."""
+    if g.user is None:
+        return None
+    if "user_object" not in g:
+        g.user_object = db.session.get(User, g.user.id)
+    return g.user_object
+
+
 @bp.route("/logout")
 def logout():
     """Clear the current session, including the stored user id."""
@@ -105,31 +170,148 @@ class AdminAccessMixin:
     """Mixin for specifying admin-only access for Flask-Admin views."""
 
     def is_accessible(self):
-        return g.user and (g.user.username == current_app.config["ADMIN_USERNAME"])
+        return g.user is not None and g.user.is_admin
 
     def inaccessible_callback(self, name, **kwargs):
         # return status 403 if user doesn't have access
         abort(403)
 
 
+class ApproximateCount(int):
+    """Row count of an admin list which wasn't counted exactly, e.g. "10,000+"."""
+
+    def __new__(cls, value, template):
+        count = super().__new__(cls, value)
+        count.template = template
+        return count
+
+    def __str__(self):
+        return self.template.format(int(self))
+
+
+class ApproximateCountQuery(Query):
+    """
+    Count query of admin lists, which stops counting at ADMIN_EXACT_COUNT_LIMIT
+    rows. Search and filters are applied to it like to any other query.
+    """
+
+    def scalar(self):
+        limit = current_app.config["ADMIN_EXACT_COUNT_LIMIT"]
+        rows = self if limit is None else self.limit(limit + 1)
+        count = (
+            self.session.query(db.func.count()).select_from(rows.subquery()).scalar()
+        )
+        if limit is None or count <= limit:
+            return count
+
+        if self.whereclause is None and db.engine.dialect.name == "mysql":
+            # the whole table, for which InnoDB keeps an estimate
+            estimate = self.session.execute(
+                db.text(
+                    "SELECT table_rows FROM information_schema.tables"
+                    " WHERE table_schema = DATABASE() AND table_name = :name"
+                ),
+                {"name": self.column_descriptions[0]["entity"].__tablename__},
+            ).scalar()
+            if estimate and estimate > limit:
+                return ApproximateCount(estimate, "~{:,}")
+        return ApproximateCount(limit, "{:,}+")
+
+
+class LeanListMixin:
+    """
+    Mixin for Flask-Admin model views of large tables. List pages load only
+    the displayed columns, and stop counting rows above ADMIN_EXACT_COUNT_LIMIT.
+    """
+
+    # displayed columns of related models, by relationship name in the list
+    column_list_related = {}
+
+    def scaffold_auto_joins(self):
+        # displayed relationships are joined by get_query instead
+        return []
+
+    def get_query(self):
+        columns = []
+        # relationships which aren't displayed aren't loaded either
+        options = [db.lazyload("*")]
+        for name, _ in self._list_columns:
+            attr = getattr(self.model, name)
+            if isinstance(attr.property, db.RelationshipProperty):
+                related = attr.property.mapper.class_
+                related_columns = [
+                    getattr(related, column)
+                    for column in self.column_list_related[name]
+                ]
+                options.append(
+                    db.joinedload(attr).options(
+                        db.load_only(*related_columns), db.lazyload("*")
+                    )
+                )
+            else:
+                columns.append(attr)
+        return super().get_query().options(db.load_only(*columns), *options)
+
+    def get_count_query(self):
+        return ApproximateCountQuery(self.model.id, self.session())
+
+
+class SoftDeleteMixin:
+    """
+    Mixin for Flask-Admin model views whose models are only flagged as deleted
+    (and purged later, see purge.py), instead of being deleted with everything
+    in them in one long transaction.
+    """
+
+    def delete_model(self, model):
+        try:
+            self.on_model_delete(model)
+            model.soft_delete()
+            self.session.commit()
+        except Exception as ex:
+            if not self.handle_view_exception(ex):
+                flash(f"Failed to delete record. {ex}", "error")
+            self.session.rollback()
+            return False
+
+        self.after_model_delete(model)
+        return True
+
+
 class CustomAdminIndexView(AdminAccessMixin, AdminIndexView):
     """Customized admin index view class for Flask-Admin."""
 
-    pass
+    @expose("/")
+    def index(self):
+        page_cache = get_page_cache()
+        return self.render(
+            "admin/index.html",
+            render_cache=render_cache.stats(),
+            user_cache=_get_user_cache().stats(),
+            pending_deletions=pending_deletions(),
+            page_cache=page_cache.stats() if page_cache else None,
+            fragment_cache=get_fragment_cache().stats(),
+        )
 
 
-class UserModelView(AdminAccessMixin, ModelView):
+class UserModelView(AdminAccessMixin, SoftDeleteMixin, LeanListMixin, ModelView):
     """Customized model view class for Flask-Admin."""
 
     page_size = 50  # the number of entries to display on the list view
     create_modal = True
     edit_modal = True
     column_searchable_list = ["username"]
-    form_excluded_columns = ["hash"]
+    form_excluded_columns = ["hash", "deleted_at"]
     column_default_sort = "username"
 
+    def after_model_change(self, form, model, is_created):
+        invalidate_user(model.id)
+
+    def after_model_delete(self, model):
+        invalidate_user(model.id)
+
 
-class TopicModelView(AdminAccessMixin, ModelView):
+class TopicModelView(AdminAccessMixin, SoftDeleteMixin, LeanListMixin, ModelView):
     """Customized model view class for Flask-Admin."""
 
     page_size = 10
@@ -137,19 +319,42 @@ class TopicModelView(AdminAccessMixin, ModelView):
     edit_modal = True
     column_searchable_list = ["name", "author.username"]
     column_sortable_list = ["name", ("author", ("author.username"))]
+    form_excluded_columns = ["posts", "post_count", "last_post_at", "deleted_at"]
+    column_list_related = {"author": ["username"]}
     form_ajax_refs = {  # this will appear as a filterable field in create/edit form
         "author": {"fields": ["username"], "page_size": 5}
     }
 
 
-class PostModelView(AdminAccessMixin, ModelView):
+class PostSearchFilter(BaseSQLAFilter):
+    """Filter for posts whose title or body match words, using the search index."""
+
+    def apply(self, query, value, alias=None):
+        return query.filter(get_search_index().condition(Post, value))
+
+    def operation(self):
+        return "matches"
+
+
+class PostModelView(AdminAccessMixin, LeanListMixin, ModelView):
     """Customized model view class for Flask-Admin."""
 
     page_size = 50
     create_modal = True
     edit_modal = True
     column_searchable_list = ["title", "topic.name"]
-    column_filters = ["body"]
+    # LIKE filters would scan every body, see search.py
+    column_filters = [PostSearchFilter(Post.body, "Title or body")]
+    # bodies are deferred, so listing them would load each one separately
+    column_exclude_list = ["body", "body_html", "body_excerpt_html"]
+    form_excluded_columns = ["body_excerpt_html", "render_pending"]
     column_sortable_list = ["created", ("topic", ("topic.name"))]
+    column_list_related = {"topic": ["name"]}
     column_default_sort = ("created", True)
     form_ajax_refs = {"topic": {"fields": ["name"], "page_size": 5}}
+
+    def get_one(self, id):
+        # load the bodies for the edit form along with the rest of the post
+        return self.session.get(
+            self.model, tools.iterdecode(id), options=POST_EDITING
+        )
@@ -1,5 +1,8 @@
+from datetime import datetime
+
 from flask import (
     Blueprint,
+    current_app,
     flash,
     g,
     redirect,
@@ -9,66 +12,219 @@ from flask import (
 )
 from werkzeug.exceptions import abort
 
-from dailypush.auth import login_required
+from dailypush.auth import current_user, login_required
 from dailypush import db, constants
-from dailypush.models import Topic, Post
+from dailypush.conditional import conditional
+from dailypush.models import User, Topic, Post, POST_LISTING, POST_EDITING
+from dailypush.feed import get_feed
 from dailypush.forms import TopicForm, PostForm
+from dailypush.page_cache import HOME_TAG, TOPICS_TAG, USERS_TAG, cached_page
+from dailypush.pagination import KeysetPagination, StreamedPagination, decode_cursor
+from dailypush.rendering import render_plain_text
+from dailypush.search import get_search_index
+from dailypush.streaming import render_page
 
 bp = Blueprint("blog", __name__)
 
 
+def topics_updated():
+    """Time of the latest change to any topic, validating pages listing topics."""
+    # the latest entry of ix_topics_updated
+    return db.session.execute(db.select(db.func.max(Topic.updated))).scalar()
+
+
+def topic_updated(id):
+    """Time of the latest change to a topic the current user can see, or None."""
+    select = db.select(Topic.updated).filter_by(id=id, deleted_at=None)
+    if g.user is None:
+        select = select.filter_by(is_public=True)
+    else:
+        select = select.where(db.or_(Topic.is_public, Topic.author_id == g.user.id))
+    return db.session.execute(select).scalar()
+
+
+def _stream_feed():
+    yield from get_feed().posts()
+
+
 @bp.route("/")
+@cached_page(HOME_TAG, USERS_TAG)
+@conditional(topics_updated)
 def index():
     """The home page."""
-    select = (
-        db.select(Post)
-        .join(Topic)
-        .filter_by(is_public=True)
-        .order_by(Post.created.desc())
-        .limit(constants.RECENT_POSTS)
-    )
-    recent_posts = db.session.execute(select).scalars()
+    # kept in memory, see feed.py
+    if current_app.config["STREAM_PAGES"]:
+        # loaded once the page header is sent, in case the feed is rebuilt
+        recent_posts = _stream_feed()
+    else:
+        recent_posts = get_feed().posts()
+
+    return render_page("blog/index.html", posts=recent_posts)
+
 
-    return render_template("blog/index.html", posts=recent_posts)
+# Sort options of the topics list: sort key (unique, thanks to the id), type of
+#   each key value in cursors, and whether the order is descending.
+TOPIC_SORTS = {
+    "name": ((Topic.name, Topic.id), (str, int), False),
+    "created": ((Topic.created, Topic.id), (datetime, int), False),
+    "activity": ((Topic.last_post_at, Topic.id), (datetime, int), True),
+}
 
 
 @bp.route("/topics")
+@cached_page(TOPICS_TAG, USERS_TAG)
+@conditional(topics_updated)
 def topics():
     """
     Show the list of current user's or public topics, depending on
     the selected tab.
+
+    Topics can be sorted by name, creation or latest activity, and filtered by
+    name. The list is paginated with cursors, so each page costs the same.
     """
     filter = request.args.get(
         "filter", default="personal" if g.user else "public", type=str
     )
+    # only the columns shown on topic cards
+    select = db.select(
+        Topic.id,
+        Topic.name,
+        Topic.created,
+        Topic.author_id,
+        Topic.post_count,
+        Topic.last_post_at,
+        User.username.label("author"),
+    )
     # visitors can also read public topics
     if filter == "public" or g.user is None:
-        select = db.select(Topic).filter_by(is_public=True)
+        filter = "public"
+        select = select.filter_by(is_public=True)
         topics_title = "Public topics"
         topics_lead = "See what others have to say"
     else:
-        # filter == "personal"
-        select = db.select(Topic).filter_by(author=g.user)
+        filter = "personal"
+        select = select.filter_by(author_id=g.user.id)
         topics_title = "Your topics"
         topics_lead = "Read, write, or edit your topics"
-    # all() returns rows, while scalars() returns objects.
-    #   I'd use all() if I was using select(Topic.id, Topic.name) above
-    topics = db.session.execute(select).scalars()
+
+    select = select.where(Topic.deleted_at.is_(None)).join(
+        User, Topic.author_id == User.id
+    )
+
+    search = request.args.get("q", default="", type=str).strip()
+    if search:
+        select = select.where(Topic.name.contains(search, autoescape=True))
+
+    sort = request.args.get("sort", default="created", type=str)
+    if sort not in TOPIC_SORTS:
+        sort = "created"
+    keys, types, desc = TOPIC_SORTS[sort]
+    # "before" leads to the previous, and "after" to the next page
+    topics = KeysetPagination(
+        select,
+        keys,
+        constants.TOPICS_PER_PAGE,
+        before=get_cursor("before", *types),
+        after=get_cursor("after", *types),
+        desc=desc,
+    )
+    # keep the selected tab, sort and filter when changing pages
+    list_args = {"filter": filter, "sort": sort, "q": search or None}
+    next_url = (
+        url_for("blog.topics", after=topics.next_cursor, **list_args)
+        if topics.has_next
+        else None
+    )
+    prev_url = (
+        url_for("blog.topics", before=topics.prev_cursor, **list_args)
+        if topics.has_prev
+        else None
+    )
+
     return render_template(
         "blog/topics.html",
         topics=topics,
         topics_title=topics_title,
         topics_lead=topics_lead,
         filter=filter,
+        sort=sort,
+        search=search,
+        next_url=next_url,
+        prev_url=prev_url,
     )
 
 
+@bp.route("/search")
+def search():
+    """
+    Search posts and topics which the current user can read: public topics, and
+    own topics when logged in. Results are ranked by the search index, best first.
+    """
+    query = request.args.get("q", default="", type=str).strip()
+    page = request.args.get("page", default=1, type=int)
+    if g.user is None:
+        visible = Topic.is_public == db.true()
+    else:
+        visible = db.or_(Topic.is_public == db.true(), Topic.author_id == g.user.id)
+    visible = db.and_(visible, Topic.deleted_at.is_(None))
+
+    topics = posts = None
+    if query:
+        index = get_search_index()
+        topics = (
+            db.session.execute(
+                index.search(db.select(Topic).where(visible), Topic, query).limit(
+                    constants.SEARCH_TOPICS
+                )
+            )
+            .scalars()
+            .all()
+        )
+        select = (
+            db.select(Post)
+            .join(Topic, Post.topic_id == Topic.id)
+            .where(visible)
+            .options(*POST_LISTING)
+        )
+        posts = db.paginate(
+            index.search(select, Post, query),
+            page=page,
+            per_page=constants.SEARCH_RESULTS_PER_PAGE,
+        )
+
+    return render_template("blog/search.html", query=query, topics=topics, posts=posts)
+
+
+def get_cursor(name, *types):
+    """
+    Get a keyset pagination cursor from the request's query string.
+
+    Args:
+        name: name of the query argument.
+        types: expected type of each value in the cursor.
+
+    Returns:
+        Tuple of cursor values, or None if the argument isn't given.
+
+    Raises:
+        400: if the cursor is malformed
+    """
+    token = request.args.get(name)
+    if token is None:
+        return None
+
+    try:
+        return decode_cursor(token, *types)
+    except ValueError:
+        abort(400)
+
+
 def get_topic(id):
     """
     Get a topic and its author by id.
 
-    Checks that the id exists and that the current user is
-    the author.
+    Checks that the id exists and that the topic is public, or
+    the current user is the author.
 
     Args:
         id: id of topic to get.
@@ -80,45 +236,71 @@ def get_topic(id):
         404: if a topic with the given id doesn't exist
         403: if the current user isn't the author
     """
-    topic = db.get_or_404(Topic, id, description=f"Topic with id {id} doesn't exist.")
+    topic = db.first_or_404(
+        db.select(Topic).filter_by(id=id, deleted_at=None),
+        description=f"Topic with id {id} doesn't exist.",
+    )
 
-    if topic.author != g.user and not topic.is_public:
+    if not topic.is_public and (g.user is None or topic.author_id != g.user.id):
+        if g.user is None:
+            # it may be their own topic, once they log in
+            abort(redirect(url_for("auth.login")))
         abort(403)
 
     return topic
 
 
 @bp.route("/topics/<int:id>")
-@login_required
+@cached_page("topic:{id}", USERS_TAG)
+@conditional(topic_updated)
 def topic(id):
     """
-    Show a single topic and all its entries, most recent first.
+    Show a single topic and all its entries, most recent first. Visitors who
+    aren't logged in can read public topics.
 
     Args:
         id: id of the selected topic.
     """
     topic = get_topic(id)
-    page = request.args.get("page", default=1, type=int)
-    select = db.select(Post).filter_by(topic_id=id).order_by(Post.created.desc())
-    posts = db.paginate(
-        select, page=page, per_page=constants.POSTS_PER_TOPIC_PAGE, count=True
-    )
-    next_url = (
-        url_for("blog.topic", id=topic.id, page=posts.next_num)
-        if posts.has_next
-        else None
-    )
-    prev_url = (
-        url_for("blog.topic", id=topic.id, page=posts.prev_num)
-        if posts.has_prev
-        else None
-    )
-    return render_template(
+    select = db.select(Post).filter_by(topic_id=id).options(*POST_LISTING)
+    exact_count = current_app.config["TOPIC_PAGINATION"] == "count"
+    # posts are fetched while the page is sent, see streaming.py
+    stream = current_app.config["STREAM_PAGES"]
+
+    if exact_count:
+        page = request.args.get("page", default=1, type=int)
+        select = select.order_by(Post.created.desc())
+        per_page = constants.POSTS_PER_TOPIC_PAGE
+        if stream:
+            posts = StreamedPagination(
+                topic.post_count,
+                select=select,
+                session=db.session(),
+                page=page,
+                per_page=per_page,
+            )
+        else:
+            posts = db.paginate(select, page=page, per_page=per_page, count=False)
+            # the topic keeps count of its posts, saving a COUNT query
+            posts.total = topic.post_count
+    else:
+        # "before" leads to newer, and "after" to older posts
+        posts = KeysetPagination(
+            select,
+            (Post.created, Post.id),
+            constants.POSTS_PER_TOPIC_PAGE,
+            before=get_cursor("before", datetime, int),
+            after=get_cursor("after", datetime, int),
+            desc=True,
+            stream=stream,
+        )
+
+    # links to newer and older posts are made by the template, after the posts
+    return render_page(
         "blog/topic.html",
         topic=topic,
         posts=posts,
-        next_url=next_url,
-        prev_url=prev_url,
+        exact_count=exact_count,
     )
 
 
@@ -129,7 +311,7 @@ def create_topic():
     form = TopicForm()
     if form.validate_on_submit():
         new_topic = Topic(
-            name=form.name.data, author=g.user, is_public=form.is_public.data
+            name=form.name.data, author=current_user(), is_public=form.is_public.data
         )
         db.session.add(new_topic)
         db.session.commit()
@@ -170,10 +352,11 @@ def delete_topic(id):
     Delete a topic.
 
     Ensures that the topic exists and that the logged in user is its
-    author.
+    author. The topic is hidden right away, and purged with its posts later
+    by `flask purge-deleted`.
     """
     topic = get_topic(id)
-    db.session.delete(topic)
+    topic.soft_delete()
     db.session.commit()
     flash("Topic deleted!")
     return redirect(url_for("blog.topics"))
@@ -189,7 +372,7 @@ def create_post(id):
         id: id of the chosen topic.
     """
     topic = get_topic(id)
-    if topic.author != g.user:
+    if topic.author_id != g.user.id:
         abort(403)
 
     form = PostForm()
@@ -201,7 +384,7 @@ def create_post(id):
     return render_template("blog/create_post.html", topic_id=id, form=form)
 
 
-def get_post(id):
+def get_post(id, options=()):
     """
     Get a post and its topic by id.
 
@@ -210,18 +393,49 @@ def get_post(id):
 
     Args:
         id: id of post to get.
+        options: loader options for the post, e.g. POST_EDITING to load its body.
 
     Returns:
         The post with the passed id.
     """
-    post = db.get_or_404(Post, id, description=f"Post id {id} doesn't exist.")
+    post = db.first_or_404(
+        db.select(Post).filter_by(id=id).options(*options),
+        description=f"Post id {id} doesn't exist.",
+    )
+    # posts of deleted topics are gone, even if not purged yet
+    if post.topic.deleted_at is not None:
+        abort(404, description=f"Post id {id} doesn't exist.")
 
-    if post.topic.author != g.user:
+    if post.topic.author_id != g.user.id:
         abort(403)
 
     return post
 
 
+@bp.route("/posts/<int:id>/body")
+def post_body(id):
+    """
+    Return the full HTML of a post, for expanding its excerpt on listing pages.
+
+    Args:
+        id: id of the post.
+    """
+    post = db.first_or_404(
+        db.select(Post)
+        .filter_by(id=id)
+        .options(db.load_only(Post.topic_id, Post.body_html)),
+        description=f"Post id {id} doesn't exist.",
+    )
+    if post.topic.deleted_at is not None:
+        abort(404, description=f"Post id {id} doesn't exist.")
+
+    is_author = g.user is not None and post.topic.author_id == g.user.id
+    if not is_author and not post.topic.is_public:
+        abort(403)
+
+    return post.body_html or render_plain_text(post.body)
+
+
 @bp.route("/update_post/<int:id>", methods=("GET", "POST"))
 @login_required
 def update_post(id):
@@ -231,7 +445,7 @@ def update_post(id):
     Args:
         id: id of the post to edit.
     """
-    post = get_post(id)
+    post = get_post(id, POST_EDITING)
 
     form = PostForm()
     if form.validate_on_submit():
@@ -0,0 +1,436 @@
+"""This module defines maintenance commands for the Flask command line."""
+import functools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from dailypush import db
+from dailypush.assets import brotli, build_assets
+from dailypush.feed import get_feed
+from dailypush.models import User, Topic, Post, topic_stats_values
+from dailypush.page_cache import HOME_TAG, TOPICS_TAG, invalidate_pages, topic_tag
+from dailypush.purge import purge_deleted
+from dailypush.render_queue import render_pending_posts
+from dailypush.rendering import render_body_and_excerpt
+from dailypush.search import rebuild_search_index
+
+
+def _checkpoint_path():
+    """Location of the file where rerender-posts saves its progress."""
+    return current_app.config.get("RERENDER_CHECKPOINT") or os.path.join(
+        current_app.instance_path, "rerender-posts.json"
+    )
+
+
+def _load_checkpoint(path, rerender_all):
+    """
+    Return the id of the last post rendered by an interrupted run, or 0 if there
+    was none, or it rendered a different set of posts (with or without --all).
+    """
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["all"] != rerender_all:
+            return 0
+        return checkpoint["last_id"]
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def _save_checkpoint(path, last_id, rerender_all):
+    # write to a temporary file first, so an interrupt never leaves a broken checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"last_id": last_id, "all": rerender_all}, f)
+    os.replace(tmp_path, path)
+
+
+@click.command("rerender-posts")
+@click.option(
+    "--all",
+    "rerender_all",
+    is_flag=True,
+    help="Re-render every post, not only the ones without HTML.",
+)
+@click.option(
+    "--chunk-size",
+    default=1000,
+    show_default=True,
+    help="Number of posts fetched, rendered and written at once.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of rendering processes (0 renders in this process). "
+    "Defaults to the number of CPUs.",
+)
+@click.option("--restart", is_flag=True, help="Ignore progress of a previous run.")
+@with_appcontext
+def rerender_posts_command(rerender_all, chunk_size, workers, restart):
+    """
+    Render post bodies to HTML in bulk.
+
+    Posts are fetched in chunks in id order and rendered in a process pool, and the
+    results are written back with batched UPDATEs, bypassing the ORM. Progress is
+    saved after each chunk, so an interrupted run resumes where it stopped.
+    """
+    checkpoint = _checkpoint_path()
+    last_id = 0 if restart else _load_checkpoint(checkpoint, rerender_all)
+    if last_id:
+        click.echo(f"Resuming after post id {last_id}.")
+
+    posts = Post.__table__
+    topics = Topic.__table__
+    select = (
+        db.select(posts.c.id, posts.c.topic_id, posts.c.body)
+        .where(posts.c.id > db.bindparam("last_id"))
+        .order_by(posts.c.id)
+        .limit(chunk_size)
+    )
+    if not rerender_all:
+        select = select.where(posts.c.body_html.is_(None))
+    # A post edited after its chunk was fetched is left alone, since its HTML (or
+    #   pending render, see render_queue.py) is already for the new body.
+    update = (
+        db.update(posts)
+        .where(
+            posts.c.id == db.bindparam("post_id"),
+            posts.c.body == db.bindparam("rendered_body"),
+        )
+        .values(
+            body_html=db.bindparam("rendered_html"),
+            body_excerpt_html=db.bindparam("rendered_excerpt"),
+            render_pending=False,
+        )
+    )
+
+    # pool processes can't be interrupted, so only the size limit applies here
+    render = functools.partial(
+        render_body_and_excerpt, max_size=current_app.config["RENDER_MAX_BODY_SIZE"]
+    )
+    executor = ProcessPoolExecutor(workers) if workers != 0 else None
+    pool_map = executor.map if executor else map
+    rendered = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            # each chunk is fetched in full before writing, since SQLite can't
+            #   commit while a read is still in progress on another connection
+            with db.engine.connect() as conn:
+                chunk = conn.execute(select, {"last_id": last_id}).all()
+            if not chunk:
+                break
+            ids = [row.id for row in chunk]
+            params = [
+                {
+                    "post_id": row.id,
+                    "rendered_body": row.body,
+                    "rendered_html": body_html,
+                    "rendered_excerpt": excerpt_html,
+                }
+                for row, (body_html, excerpt_html) in zip(
+                    chunk, pool_map(render, [row.body for row in chunk])
+                )
+            ]
+            topic_ids = {row.topic_id for row in chunk}
+            with db.engine.begin() as conn:
+                conn.execute(update, params)
+                # pages of the topics changed, see conditional.py
+                conn.execute(
+                    db.update(topics)
+                    .where(topics.c.id.in_(topic_ids))
+                    .values(updated=datetime.utcnow())
+                )
+            # the bulk UPDATEs bypass session events, which keep the feed and
+            #   cached pages up to date
+            get_feed().evict(post_ids=set(ids))
+            invalidate_pages(
+                HOME_TAG, TOPICS_TAG, *(topic_tag(id) for id in topic_ids)
+            )
+            rendered += len(ids)
+            last_id = ids[-1]
+            _save_checkpoint(checkpoint, last_id, rerender_all)
+            click.echo(f"Rendered {rendered} posts (up to id {last_id}).")
+    finally:
+        if executor:
+            executor.shutdown()
+
+    # the run is complete, so the next one starts from scratch
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Done, rendered {rendered} posts in {elapsed:.1f}s"
+        f" ({rendered / elapsed if elapsed else 0:.0f} posts/s)."
+    )
+
+
+@click.command("render-worker")
+@click.option(
+    "--batch-size",
+    default=100,
+    show_default=True,
+    help="Number of pending posts rendered per transaction.",
+)
+@click.option(
+    "--interval",
+    default=1.0,
+    show_default=True,
+    help="Seconds to wait before polling an empty queue again.",
+)
+@click.option("--once", is_flag=True, help="Exit as soon as the queue is empty.")
+@with_appcontext
+def render_worker_command(batch_size, interval, once):
+    """Render posts saved while RENDER_MODE is "worker"."""
+    click.echo("Rendering pending posts. Press CTRL+C to quit.")
+    rendered = 0
+    try:
+        while True:
+            count = render_pending_posts(batch_size)
+            rendered += count
+            if count:
+                click.echo(f"Rendered {rendered} posts.")
+            elif once:
+                break
+            else:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@click.command("purge-deleted")
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of rows purged per transaction.",
+)
+@click.option(
+    "--pause",
+    default=0.0,
+    show_default=True,
+    help="Seconds to wait between transactions, to leave room for other queries.",
+)
+@with_appcontext
+def purge_deleted_command(batch_size, pause):
+    """Purge deleted users and topics, with their posts, in small transactions."""
+    purged = 0
+    while True:
+        count = purge_deleted(batch_size)
+        if not count:
+            break
+        purged += count
+        click.echo(f"Purged {purged} rows.")
+        time.sleep(pause)
+
+    click.echo(f"Done, purged {purged} rows.")
+
+
+@click.command("recount-topics")
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of topics recounted per transaction.",
+)
+@with_appcontext
+def recount_topics_command(batch_size):
+    """Recompute post counts and latest activity of all topics from their posts."""
+    topics = Topic.__table__
+    last_id = 0
+    recounted = 0
+    while True:
+        select = (
+            db.select(topics.c.id)
+            .where(topics.c.id > last_id)
+            .order_by(topics.c.id)
+            .limit(batch_size)
+        )
+        ids = db.session.execute(select).scalars().all()
+        if not ids:
+            break
+        db.session.execute(
+            db.update(topics)
+            .where(topics.c.id.between(ids[0], ids[-1]))
+            .values(**topic_stats_values(topics))
+        )
+        db.session.commit()
+        recounted += len(ids)
+        last_id = ids[-1]
+
+    click.echo(f"Recounted {recounted} topics.")
+
+
+# Tables in the order they're exported and imported, so foreign keys are satisfied
+EXPORT_TABLES = (User.__table__, Topic.__table__, Post.__table__)
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Can't export {type(value).__name__} values.")
+
+
+@click.command("export")
+@click.argument("output", type=click.File("w", encoding="utf-8"), default="-")
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of rows fetched from the database at once.",
+)
+@with_appcontext
+def export_command(output, batch_size):
+    """
+    Export users, topics and posts as JSON lines, to OUTPUT or standard output.
+
+    Every line holds one row: {"table": ..., "row": {column: value, ...}}. Rows are
+    streamed from the database, so memory use doesn't grow with its size.
+    """
+    exported = 0
+    start = time.perf_counter()
+    with db.engine.connect() as conn:
+        for table in EXPORT_TABLES:
+            select = (
+                db.select(table)
+                .order_by(*table.primary_key.columns)
+                .execution_options(yield_per=batch_size)
+            )
+            for chunk in conn.execute(select).partitions():
+                for row in chunk:
+                    line = {"table": table.name, "row": dict(row._mapping)}
+                    output.write(json.dumps(line, default=_to_json) + "\n")
+                exported += len(chunk)
+
+    elapsed = time.perf_counter() - start
+    # report on stderr, since the export itself may go to stdout
+    click.echo(
+        f"Exported {exported} rows in {elapsed:.1f}s"
+        f" ({exported / elapsed if elapsed else 0:.0f} rows/s).",
+        err=True,
+    )
+
+
+def _parse_row(table, row):
+    """Convert JSON values of an exported row back to column values."""
+    values = {}
+    for name, value in row.items():
+        column = table.columns.get(name)
+        if column is None:
+            # dropped from the schema since the export
+            continue
+        # dialect variants (e.g. of `updated` columns) wrap the generic type
+        column_type = getattr(column.type, "impl", column.type)
+        if value is not None and isinstance(column_type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        values[name] = value
+    return values
+
+
+@click.command("import")
+@click.argument("input", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of rows inserted per statement.",
+)
+@click.option(
+    "--render",
+    type=click.Choice(["missing", "all", "none"]),
+    default="missing",
+    show_default=True,
+    help="Which posts to render: those without HTML, all of them, or none "
+    "(leaving missing HTML to `flask rerender-posts`).",
+)
+@with_appcontext
+def import_command(input, batch_size, render):
+    """
+    Import users, topics and posts exported by `flask export` from INPUT.
+
+    Rows keep their ids, and are inserted in batches bypassing the ORM, so posts
+    keep their exported HTML instead of being rendered again. The input is read
+    line by line, so dumps of any size can be imported. The search index is
+    rebuilt afterwards.
+    """
+    tables = {table.name: table for table in EXPORT_TABLES}
+    render_post = functools.partial(
+        render_body_and_excerpt, max_size=current_app.config["RENDER_MAX_BODY_SIZE"]
+    )
+    imported = 0
+    start = time.perf_counter()
+
+    def flush(table, rows):
+        with db.engine.begin() as conn:
+            conn.execute(db.insert(table), rows)
+        rows.clear()
+
+    table = None
+    rows = []
+    for line in input:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        if data["table"] not in tables:
+            raise click.ClickException(f"Unknown table {data['table']!r}.")
+        if rows and (data["table"] != table.name or len(rows) >= batch_size):
+            flush(table, rows)
+        table = tables[data["table"]]
+        values = _parse_row(table, data["row"])
+        if table.name == "posts" and (
+            render == "all"
+            or (
+                render == "missing"
+                and values.get("body_html") is None
+                and not values.get("render_pending")
+            )
+        ):
+            values["body_html"], values["body_excerpt_html"] = render_post(
+                values["body"]
+            )
+            values["render_pending"] = False
+        rows.append(values)
+        imported += 1
+        if imported % 10000 == 0:
+            click.echo(f"Imported {imported} rows.")
+    if rows:
+        flush(table, rows)
+    with db.engine.begin() as conn:
+        rebuild_search_index(conn)
+
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Done, imported {imported} rows in {elapsed:.1f}s"
+        f" ({imported / elapsed if elapsed else 0:.0f} rows/s)."
+    )
+
+
+@click.command("reindex-search")
+@with_appcontext
+def reindex_search_command():
+    """Rebuild the search index, after changes made bypassing the ORM."""
+    with db.engine.begin() as conn:
+        rebuild_search_index(conn)
+    click.echo("Rebuilt the search index.")
+
+
+@click.command("build-assets")
+@with_appcontext
+def build_assets_command():
+    """Minify and precompress static files, with content hashes in their names."""
+    for name, built_name, size, built_size, gzipped_size in build_assets(
+        current_app.static_folder
+    ):
+        line = f"{name} -> {built_name} ({size:,} -> {built_size:,} bytes"
+        if gzipped_size is not None:
+            line += f", {gzipped_size:,} gzipped"
+        click.echo(line + ")")
+    if brotli is None:
+        click.echo("Install brotli to build .br copies too.")
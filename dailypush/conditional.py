@@ -0,0 +1,61 @@
+"""
+This module answers conditional GET requests to pages that haven't changed.
+
+A page's validator is derived from the time its content last changed (the
+`updated` time of its topic, or the latest one of all topics), its URL and the
+viewer. The time costs one indexed query, so when the browser's copy is still
+current (If-None-Match), the view answers 304 Not Modified before loading
+posts or rendering templates.
+"""
+import functools
+import hashlib
+
+from flask import current_app, g, request, session
+
+
+def page_etag(updated):
+    """Return the entity tag of the requested page, last changed at updated."""
+    viewer = tuple(g.user) if g.user else None
+    key = (updated.isoformat(), request.full_path, viewer)
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def conditional(last_updated):
+    """
+    View decorator answering 304 Not Modified to requests for unchanged pages.
+
+    Args:
+        last_updated: function called with the view's arguments, which returns
+            the time the page last changed, or None to always render the view
+            (e.g. the page doesn't exist, or the viewer can't see it).
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                # flashed messages are shown once
+                or "_flashes" in session
+            ):
+                return view(**kwargs)
+            updated = last_updated(**kwargs)
+            if updated is None:
+                return view(**kwargs)
+
+            # weak, since the same page may be rendered byte for byte differently
+            etag = page_etag(updated)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # always check with the server before using the copy
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapped_view
+
+    return decorator
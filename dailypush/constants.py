@@ -6,4 +6,55 @@ PASSWORD_MIN_LENGTH = 8
 PASSWORD_MAX_LENGTH = 15
 
 POSTS_PER_TOPIC_PAGE = 15
+TOPICS_PER_PAGE = 20
+SEARCH_RESULTS_PER_PAGE = 15
+# matching topics listed above the matching posts
+SEARCH_TOPICS = 5
 RECENT_POSTS = 5
+# approximate number of text characters of a post shown on listing pages
+EXCERPT_LENGTH = 1000
+
+# HTML tags allowed in rendered posts. Should match the whitelist in
+#   pagedown_sanitizer.js for consistency between client-previewed and
+#   server-rendered HTML. See also: https://meta.stackexchange.com/a/135909
+ALLOWED_TAGS = frozenset(
+    {
+        "a",
+        "blockquote",
+        "br",
+        "code",
+        "del",
+        "em",
+        "h5",
+        "h6",
+        "hr",
+        "li",
+        "ol",
+        "p",
+        "pre",
+        "strong",
+        "sub",
+        "sup",
+        "ul",
+    }
+)
+
+# Bump whenever the Markdown-to-HTML pipeline (conversion, heading remapping or
+#   sanitizer whitelist) changes, so previously cached renders are not reused.
+RENDERER_VERSION = 1
+RENDER_CACHE_SIZE = 1024
+USER_CACHE_SIZE = 1024
+ADMIN_EXACT_COUNT_LIMIT = 10_000
+PAGE_CACHE_SIZE = 1024
+# two fragments per post, the header once per viewer class
+FRAGMENT_CACHE_SIZE = 4096
+# hex digits of the content hash in names of built static files
+ASSET_HASH_LENGTH = 12
+# built static files never change, so browsers may keep them for a year
+BUILT_ASSET_MAX_AGE = 365 * 24 * 60 * 60
+# characters of a streamed page sent at once, and its on-the-fly gzip level
+STREAM_CHUNK_SIZE = 8 * 1024
+STREAM_GZIP_LEVEL = 6
+RENDER_PROCESSES = 2
+# longest post body rendered as Markdown, in characters
+RENDER_MAX_BODY_SIZE = 100_000
@@ -0,0 +1,264 @@
+"""
+This module keeps the home page's feed of recent public posts in memory.
+
+Instead of joining posts with topics on every home page view, each app process
+keeps the latest RECENT_POSTS public posts as lightweight snapshots. The feed is
+built on first use, and kept in sync by session events: a new post in a loaded
+public topic is added right away, while any other change that may affect the feed
+(edited or deleted posts, topics made private, renamed users...) evicts the
+affected posts on commit and has the feed rebuilt on next use.
+
+Changes made by other processes (other app workers, `flask render-worker`) are
+invisible to the events, so the feed is also rebuilt every RECENT_POSTS_TTL seconds.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+
+from dailypush import db, constants
+from dailypush.models import User, Topic, Post
+
+# Snapshot of a post, with everything _single_post.html shows.
+#   topic is a dictionary with id, name, author_id and author (the username).
+FeedPost = namedtuple(
+    "FeedPost",
+    [
+        "id",
+        "title",
+        "created",
+        "body",
+        "body_html",
+        "body_excerpt_html",
+        "render_pending",
+        "updated",
+        "topic",
+    ],
+)
+
+
+def _sort_key(post):
+    return post.created, post.id
+
+
+class RecentPostsFeed:
+    """Thread-safe list of the most recent public posts, newest first."""
+
+    def __init__(self, size, ttl=None):
+        """
+        Args:
+            size: number of posts in the feed.
+            ttl: seconds after which the feed is rebuilt (None keeps it until
+                it's invalidated).
+        """
+        self.size = size
+        self.ttl = ttl
+        self._posts = []
+        self._lock = threading.Lock()
+        # every change bumps the version, so a rebuild that was already running
+        #   when the change happened doesn't overwrite it
+        self._version = 0
+        self._built_version = None
+        self._built_at = 0.0
+
+    def _is_fresh(self):
+        return self._built_version == self._version and (
+            self.ttl is None or time.monotonic() - self._built_at < self.ttl
+        )
+
+    def posts(self):
+        """Return the recent public posts, rebuilding the feed if needed."""
+        with self._lock:
+            if self._is_fresh():
+                return list(self._posts)
+            version = self._version
+
+        posts = self._load()
+        with self._lock:
+            if self._version == version:
+                self._posts = posts
+                self._built_version = version
+                self._built_at = time.monotonic()
+        return list(posts)
+
+    def _load(self):
+        select = (
+            db.select(
+                Post.id,
+                Post.title,
+                Post.created,
+                # the Markdown is only shown for posts without HTML
+                db.case((Post.body_html.is_(None), Post.body)).label("body"),
+                Post.body_html,
+                Post.body_excerpt_html,
+                Post.render_pending,
+                Post.updated,
+                Topic.id.label("topic_id"),
+                Topic.name.label("topic_name"),
+                Topic.author_id,
+                User.username,
+            )
+            .join(Topic, Post.topic_id == Topic.id)
+            .join(User, Topic.author_id == User.id)
+            .where(Topic.is_public == db.true(), Topic.deleted_at.is_(None))
+            .order_by(Post.created.desc(), Post.id.desc())
+            .limit(self.size)
+        )
+        return [
+            FeedPost(
+                row.id,
+                row.title,
+                row.created,
+                row.body,
+                row.body_html,
+                row.body_excerpt_html,
+                row.render_pending,
+                row.updated,
+                {
+                    "id": row.topic_id,
+                    "name": row.topic_name,
+                    "author_id": row.author_id,
+                    "author": row.username,
+                },
+            )
+            # not from a replica, which may not have the changes that invalidated
+            #   the feed yet
+            for row in db.session.execute(
+                select, bind_arguments={"bind": db.engine}
+            )
+        ]
+
+    def add(self, post):
+        """Add a new public post (a FeedPost) without rebuilding the feed."""
+        with self._lock:
+            fresh = self._is_fresh()
+            self._version += 1
+            if not fresh:
+                return
+            posts = sorted([*self._posts, post], key=_sort_key, reverse=True)
+            self._posts = posts[: self.size]
+            self._built_version = self._version
+
+    def evict(self, post_ids=(), topic_ids=(), author_ids=()):
+        """
+        Remove the given posts, and posts in the given topics or by the given
+        authors, right away. The feed is refilled on next use.
+        """
+        with self._lock:
+            self._posts = [
+                post
+                for post in self._posts
+                if post.id not in post_ids
+                and post.topic["id"] not in topic_ids
+                and post.topic["author_id"] not in author_ids
+            ]
+            self._version += 1
+
+    def invalidate(self):
+        """Rebuild the feed on next use."""
+        self.evict()
+
+
+def get_feed(app=None):
+    """Return the recent posts feed of the app, creating it on first use."""
+    app = app or current_app._get_current_object()
+    feed = app.extensions.get("recent_posts_feed")
+    if feed is None:
+        feed = app.extensions.setdefault(
+            "recent_posts_feed",
+            RecentPostsFeed(constants.RECENT_POSTS, app.config["RECENT_POSTS_TTL"]),
+        )
+    return feed
+
+
+def _snapshot(post):
+    """
+    Return FeedPost of a newly flushed post, None if its topic isn't public,
+    or False if that can't be told without loading the topic.
+    """
+    topic = db.inspect(post).attrs.topic.loaded_value
+    if not isinstance(topic, Topic) or db.inspect(topic).unloaded & {
+        "id",
+        "name",
+        "is_public",
+        "author",
+    }:
+        return False
+    author = topic.author
+    if db.inspect(author).unloaded & {"id", "username"}:
+        return False
+    if not topic.is_public:
+        return None
+    return FeedPost(
+        post.id,
+        post.title,
+        post.created,
+        post.body,
+        post.body_html,
+        post.body_excerpt_html,
+        post.render_pending,
+        post.updated,
+        {
+            "id": topic.id,
+            "name": topic.name,
+            "author_id": author.id,
+            "author": author.username,
+        },
+    )
+
+
+def _collect_changes(session, flush_context):
+    """Remember how the flushed changes affect the feed, until they're committed."""
+    changes = session.info.setdefault(
+        "recent_posts_feed",
+        {"added": [], "posts": set(), "topics": set(), "authors": set()},
+    )
+    for obj in session.new:
+        if isinstance(obj, Post):
+            snapshot = _snapshot(obj)
+            if snapshot:
+                changes["added"].append(snapshot)
+            elif snapshot is False:
+                changes["posts"].add(obj.id)
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Post):
+            changes["posts"].add(obj.id)
+        elif isinstance(obj, Topic):
+            changes["topics"].add(obj.id)
+        elif isinstance(obj, User):
+            changes["authors"].add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            changes["posts"].add(obj.id)
+        elif isinstance(obj, Topic):
+            changes["topics"].add(obj.id)
+        elif isinstance(obj, User):
+            changes["authors"].add(obj.id)
+
+
+def _apply_changes(session):
+    """Update the feed with the committed changes."""
+    changes = session.info.pop("recent_posts_feed", None)
+    if changes is None:
+        return
+    feed = current_app.extensions.get("recent_posts_feed")
+    if feed is None:
+        # not built yet, so it will be up to date anyway
+        return
+
+    if changes["posts"] or changes["topics"] or changes["authors"]:
+        feed.evict(changes["posts"], changes["topics"], changes["authors"])
+    for post in changes["added"]:
+        feed.add(post)
+
+
+def _discard(session, previous_transaction):
+    session.info.pop("recent_posts_feed", None)
+
+
+db.event.listen(db.session, "after_flush", _collect_changes)
+db.event.listen(db.session, "after_commit", _apply_changes)
+db.event.listen(db.session, "after_soft_rollback", _discard)
@@ -0,0 +1,56 @@
+"""
+This module caches rendered fragments of templates, with a {% cache %} tag.
+
+    {% cache "post-body", post.id, post.updated %}
+      ...
+    {% endcache %}
+
+The arguments form the key of the fragment, so they must include everything the
+fragment shows that may change, e.g. the post's `updated` version. Changed posts
+then simply get new keys, and the stale fragments age out of the bounded cache.
+Fragments are cached in the memory of each process, FRAGMENT_CACHE_SIZE of them
+(0 disables the cache).
+"""
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from dailypush.utils import LRUCache
+
+
+def get_fragment_cache(app=None):
+    """Return the fragment cache of the app."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get("fragment_cache")
+    if cache is None:
+        cache = app.extensions.setdefault(
+            "fragment_cache", LRUCache(app.config["FRAGMENT_CACHE_SIZE"])
+        )
+    return cache
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja extension adding the {% cache key, ... %}...{% endcache %} tag."""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render_cached", [nodes.Tuple(key, "load")]),
+            [],
+            [],
+            body,
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        cache = get_fragment_cache()
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.set(key, fragment)
+        return fragment
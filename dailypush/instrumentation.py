@@ -0,0 +1,175 @@
+"""
+This module measures the SQL queries issued while handling each request.
+
+With SQL_INSTRUMENTATION enabled, every response gets a Server-Timing header with
+the number of queries and the time spent running them, and every request is logged
+on the "dailypush.instrumentation" logger. Statements repeated at least
+SQL_REPEATED_QUERY_THRESHOLD times with different parameters, the usual sign of an
+N+1 pattern (e.g. a lazy relationship accessed in a loop), are logged as warnings.
+
+Tests can use collect_queries directly, to check query budgets of any code.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, request
+from sqlalchemy.engine import Engine
+
+from dailypush import db
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# Literals and lists of parameters, which differ between executions of a statement
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMS_RE = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """Return statement without the parts that change between its executions."""
+    statement = _STRING_RE.sub("?", statement)
+    statement = _NUMBER_RE.sub("?", statement)
+    statement = _PARAMS_RE.sub("(...)", statement)
+    return _SPACE_RE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Number, total duration, statements and fingerprints of the recorded queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # in the order they ran, parameters[i] being those of statements[i]
+        self.statements = []
+        self.parameters = []
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration, parameters=None):
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """Return (fingerprint, count) of statements run at least threshold times."""
+        return [
+            (statement, count)
+            for statement, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+def _collectors():
+    try:
+        return _local.collectors
+    except AttributeError:
+        _local.collectors = []
+        return _local.collectors
+
+
+@contextmanager
+def collect_queries():
+    """Record queries issued by the current thread inside the with block."""
+    stats = QueryStats()
+    collectors = _collectors()
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors():
+        # on the statement's own execution context, so a statement which raises
+        #   doesn't leave its start time behind for the next one
+        context._query_start = time.perf_counter()
+
+
+def _record(context, statement, parameters):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    del context._query_start
+    duration = time.perf_counter() - start
+    for stats in _collectors():
+        stats.record(statement, duration, parameters)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record(context, statement, parameters)
+
+
+def _handle_error(exception_context):
+    # failed statements took database time too
+    if exception_context.execution_context is not None:
+        _record(
+            exception_context.execution_context,
+            exception_context.statement,
+            exception_context.parameters,
+        )
+
+
+# listening on the Engine class covers every engine, including binds
+db.event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+db.event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+db.event.listen(Engine, "handle_error", _handle_error)
+
+
+def _start_request():
+    g.sql_stats = QueryStats()
+    _collectors().append(g.sql_stats)
+
+
+def _finish_request(response):
+    stats = g.get("sql_stats")
+    if stats is None:
+        return response
+
+    response.headers.add(
+        "Server-Timing",
+        f'sql;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+    )
+    repeated = stats.repeated(current_app.config["SQL_REPEATED_QUERY_THRESHOLD"])
+    logger.info(
+        "sql method=%s path=%s endpoint=%s status=%d queries=%d sql_ms=%.1f "
+        "repeated=%d",
+        request.method,
+        request.path,
+        request.endpoint,
+        response.status_code,
+        stats.count,
+        stats.duration * 1000,
+        len(repeated),
+    )
+    for statement, count in repeated:
+        logger.warning(
+            "possible N+1 endpoint=%s count=%d statement=%.200s",
+            request.endpoint,
+            count,
+            statement,
+        )
+    return response
+
+
+def _stop_request(exc):
+    stats = g.pop("sql_stats", None)
+    if stats is not None and stats in _collectors():
+        _collectors().remove(stats)
+
+
+def init_app(app):
+    """Instrument the app's requests, if SQL_INSTRUMENTATION is enabled."""
+    if not app.config["SQL_INSTRUMENTATION"]:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_stop_request)
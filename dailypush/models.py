@@ -1,9 +1,14 @@
 from datetime import datetime
-from markdown import markdown
-import bleach
+
+from flask import current_app
+from sqlalchemy.dialects import mysql
 
 from dailypush import db, constants
-from dailypush.utils import multireplace
+from dailypush.rendering import cached_render_body, make_excerpt
+
+# Type of `updated` timestamps, with microseconds on MySQL too, so that changes
+#   within the same second still tell apart
+UPDATED_TYPE = db.DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
 
 
 class User(db.Model):
@@ -13,6 +18,9 @@ class User(db.Model):
         db.String(constants.USERNAME_MAX_LENGTH), unique=True, nullable=False
     )
     hash = db.Column(db.String(103), nullable=False)
+    # Deleted users and topics are only flagged at first, and hidden everywhere.
+    #   Their rows are purged later in small batches, see purge.py
+    deleted_at = db.Column(db.DateTime, index=True)
 
     topics = db.relationship(
         "Topic",
@@ -29,9 +37,32 @@ class User(db.Model):
         """String representation of object, intended for debugging."""
         return "<User: %r>" % self.username
 
+    def soft_delete(self):
+        """Flag the user and all their topics as deleted."""
+        self.deleted_at = datetime.utcnow()
+        topics = Topic.__table__
+        db.session.execute(
+            db.update(topics)
+            .where(topics.c.author_id == self.id, topics.c.deleted_at.is_(None))
+            .values(deleted_at=self.deleted_at)
+        )
+
 
 class Topic(db.Model):
     __tablename__ = "topics"
+    __table_args__ = (
+        # topics list, public or personal
+        db.Index("ix_topics_is_public_created", "is_public", "created"),
+        db.Index("ix_topics_author_id_created", "author_id", "created"),
+        # topics list, by latest activity
+        db.Index("ix_topics_is_public_last_post_at", "is_public", "last_post_at"),
+        db.Index("ix_topics_author_id_last_post_at", "author_id", "last_post_at"),
+        # topics list, by name
+        db.Index("ix_topics_is_public_name", "is_public", "name"),
+        db.Index("ix_topics_author_id_name", "author_id", "name"),
+        # validators of pages listing topics, see conditional.py
+        db.Index("ix_topics_updated", "updated"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, index=True)
     created = db.Column(db.DateTime, default=datetime.utcnow)
@@ -41,6 +72,23 @@ class Topic(db.Model):
     #   in already existing topics:
     #   https://github.com/miguelgrinberg/Flask-Migrate/issues/265#issuecomment-937057519
     is_public = db.Column(db.Boolean, nullable=False, server_default=db.sql.False_())
+    # Denormalized post statistics, kept up to date by Post events below.
+    # Run `flask recount-topics` if they ever drift (e.g. after manual SQL changes).
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # time of the latest post, or of topic creation while there are no posts,
+    #   so that topics can be sorted by latest activity
+    last_post_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda context: context.get_current_parameters()["created"],
+    )
+    deleted_at = db.Column(db.DateTime, index=True)
+    # Time of the latest change to anything shown on the topic's pages: the topic,
+    #   its posts, or its author's name. Bumped by UPDATEs of the topic, including
+    #   those of the Post and User events below.
+    updated = db.Column(
+        UPDATED_TYPE, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
     # User object backed by author_id
     # lazy="joined" means the user is returned with the post in one query
@@ -62,15 +110,40 @@ class Topic(db.Model):
         """String representation of object, intended for debugging."""
         return "<Topic: %r>" % self.name
 
+    def soft_delete(self):
+        """Flag the topic, and so its posts, as deleted."""
+        self.deleted_at = datetime.utcnow()
+
 
 class Post(db.Model):
     __tablename__ = "posts"
+    __table_args__ = (
+        # topic page, newest first (also by cursor)
+        db.Index("ix_posts_topic_id_created_id", "topic_id", "created", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    created = db.Column(db.DateTime, default=datetime.utcnow)
+    # indexed for recent public posts on the home page
+    created = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     title = db.Column(db.String(100), nullable=True, index=True)
-    body = db.Column(db.Text, nullable=False)
-    body_html = db.Column(db.Text)
+    # Bodies are the bulk of a post, so they're only loaded when accessed, or with
+    #   the loader options below (POST_LISTING, POST_EDITING)
+    body = db.deferred(db.Column(db.Text, nullable=False), group="source")
+    body_html = db.deferred(db.Column(db.Text), group="html")
+    # leading part of body_html shown on listing pages, if the post is long
+    body_excerpt_html = db.deferred(db.Column(db.Text), group="html")
+    # set when body_html is left for a background worker to render
+    render_pending = db.Column(
+        db.Boolean,
+        nullable=False,
+        default=False,
+        server_default=db.sql.False_(),
+        index=True,
+    )
     topic_id = db.Column(db.ForeignKey(Topic.id, ondelete="CASCADE"), nullable=False)
+    # time of the latest change, also by bulk UPDATEs (e.g. the render queue)
+    updated = db.Column(
+        UPDATED_TYPE, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
     topic = db.relationship(Topic, lazy="joined", back_populates="posts")
 
@@ -91,55 +164,131 @@ class Post(db.Model):
         Taken from "Flask Web Development, 2e", chapter 11. See also:
         https://docs.sqlalchemy.org/en/14/core/event.html#modifiers
         """
-        # Convert post body from Markdown to HTML
-        body_html = markdown(value, output_format="html")
-
-        # Scale down headings in converted HTML.
-        # Should be consistent with live preview.
-        replacements = {
-            "<h6>": "<h6>#### ",
-            "<h5>": "<h6>### ",
-            "</h5>": "</h6>",
-            "<h4>": "<h6>## ",
-            "</h4>": "</h6>",
-            "<h3>": "<h6># ",
-            "</h3>": "</h6>",
-            "<h2>": "<h6>",
-            "</h2>": "</h6>",
-            "<h1>": "<h5>",
-            "</h1>": "</h5>",
-        }
-        body_html = multireplace(body_html, replacements, ignore_case=True)
-
-        # Allowed HTML tags in the preview (should be a superset of what is here):
-        #   https://meta.stackexchange.com/a/135909
-        # Tags below should match the whitelist in pagedown.sanitizer.js for consistency
-        #   between client-previewed and server-rendered HTML
-        allowed_tags = [
-            "a",
-            "blockquote",
-            "br",
-            "code",
-            "del",
-            "em",
-            "h5",
-            "h6",
-            "hr",
-            "li",
-            "ol",
-            "p",
-            "pre",
-            "strong",
-            "sub",
-            "sup",
-            "ul",
-        ]
-        # Sanitize converted post
-        body_html = bleach.linkify(
-            bleach.clean(body_html, tags=allowed_tags, strip=True)
-        )
+        # Saving an unchanged body (e.g. from the post editor or admin) is a no-op
+        if value == oldvalue and target.body_html is not None:
+            return
 
-        target.body_html = body_html
+        if current_app.config["RENDER_MODE"] != "sync":
+            # leave rendering to the background render queue
+            target.body_html = None
+            target.body_excerpt_html = None
+            target.render_pending = True
+            return
+
+        target.body_html = cached_render_body(value)
+        target.body_excerpt_html = make_excerpt(target.body_html)
+        target.render_pending = False
 
 
 db.event.listen(Post.body, "set", Post.on_changed_body)
+
+# Loader options for posts, see:
+#   https://docs.sqlalchemy.org/en/14/orm/loading_columns.html
+# Pages listing posts show header fields and rendered HTML, never the raw Markdown.
+POST_LISTING = (
+    db.load_only(
+        Post.id,
+        Post.created,
+        Post.title,
+        Post.topic_id,
+        Post.render_pending,
+        # versions the cached HTML of the post, see fragment_cache.py
+        Post.updated,
+        Post.body_html,
+        Post.body_excerpt_html,
+    ),
+)
+# Editing a post needs the raw Markdown, and the HTML to tell whether it changed.
+POST_EDITING = (db.undefer_group("source"), db.undefer_group("html"))
+
+
+def topic_stats_values(topics):
+    """
+    Values for recounting topic statistics from posts, for an UPDATE of topics.
+
+    Args:
+        topics: the topics table, or an alias of it.
+    """
+    posts = Post.__table__
+    return {
+        "post_count": db.select(db.func.count(posts.c.id))
+        .where(posts.c.topic_id == topics.c.id)
+        .scalar_subquery(),
+        "last_post_at": db.func.coalesce(
+            db.select(db.func.max(posts.c.created))
+            .where(posts.c.topic_id == topics.c.id)
+            .scalar_subquery(),
+            topics.c.created,
+        ),
+    }
+
+
+def _count_inserted_post(mapper, connection, target):
+    topics = Topic.__table__
+    connection.execute(
+        db.update(topics)
+        .where(topics.c.id == target.topic_id)
+        .values(
+            post_count=topics.c.post_count + 1,
+            last_post_at=db.case(
+                (topics.c.last_post_at >= target.created, topics.c.last_post_at),
+                else_=target.created,
+            ),
+        )
+    )
+
+
+def _count_deleted_post(mapper, connection, target):
+    topics = Topic.__table__
+    values = topic_stats_values(topics)
+    connection.execute(
+        db.update(topics)
+        .where(topics.c.id == target.topic_id)
+        .values(
+            post_count=topics.c.post_count - 1, last_post_at=values["last_post_at"]
+        )
+    )
+
+
+def _recount_moved_post(mapper, connection, target):
+    """
+    Recount statistics of the affected topics if a post moved or was backdated,
+    or else just bump the `updated` time of its topic.
+    """
+    state = db.inspect(target)
+    topic_history = state.attrs.topic_id.history
+    topics = Topic.__table__
+    if not (topic_history.has_changes() or state.attrs.created.history.has_changes()):
+        connection.execute(
+            db.update(topics)
+            .where(topics.c.id == target.topic_id)
+            .values(updated=target.updated)
+        )
+        return
+
+    topic_ids = {target.topic_id, *topic_history.deleted}
+    connection.execute(
+        db.update(topics)
+        .where(topics.c.id.in_(topic_ids))
+        .values(**topic_stats_values(topics))
+    )
+
+
+db.event.listen(Post, "after_insert", _count_inserted_post)
+db.event.listen(Post, "after_delete", _count_deleted_post)
+db.event.listen(Post, "after_update", _recount_moved_post)
+
+
+def _touch_renamed_author_topics(mapper, connection, target):
+    """Bump the `updated` time of topics showing a renamed user's name."""
+    if not db.inspect(target).attrs.username.history.has_changes():
+        return
+    topics = Topic.__table__
+    connection.execute(
+        db.update(topics)
+        .where(topics.c.author_id == target.id)
+        .values(updated=datetime.utcnow())
+    )
+
+
+db.event.listen(User, "after_update", _touch_renamed_author_topics)
@@ -0,0 +1,295 @@
+"""
+This module caches whole pages served to visitors who aren't logged in.
+
+Cached pages are keyed by their URL, query string included, and stored in memory
+(PAGE_CACHE "memory", per process) or in files under the instance folder
+(PAGE_CACHE "filesystem", shared by all processes of the app).
+
+Every page is tagged with what it shows, e.g. "topic:3" for the pages of topic 3,
+and the current versions of its tags are part of its key. Session events bump the
+versions of the tags affected by committed changes, so pages stored before are
+never found again, and age out of the cache. That way a new post only drops its
+topic's pages, the topics list and the home page. Changes that bypass the ORM call
+invalidate_pages themselves, and anything missed still expires after
+PAGE_CACHE_TTL seconds.
+
+Responses carry an X-Cache header ("HIT" or "MISS") for measuring the hit ratio.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from flask import current_app, g, request, session
+
+from dailypush import db
+from dailypush.models import User, Topic, Post
+from dailypush.routing import read_from_primary
+from dailypush.utils import LRUCache
+
+# A cached response
+CachedPage = namedtuple("CachedPage", ["body", "status", "headers"])
+
+# Tags of pages listing topics, and of the home page
+TOPICS_TAG = "topics"
+HOME_TAG = "home"
+# usernames are shown on most pages
+USERS_TAG = "users"
+
+
+def topic_tag(topic_id):
+    """Tag of the pages of a single topic."""
+    return f"topic:{topic_id}"
+
+
+class MemoryPageCache:
+    """Page cache of one process, keeping the most recently used pages."""
+
+    def __init__(self, maxsize, ttl=None):
+        self._pages = LRUCache(maxsize, ttl=ttl)
+        # tag versions are never evicted, or stale pages could match again
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._pages.get(key)
+
+    def set(self, key, page):
+        self._pages.set(key, page)
+
+    def tag_versions(self, tags):
+        """Return the current version of each tag, as a tuple."""
+        with self._lock:
+            return tuple(self._tags.get(tag, 0) for tag in tags)
+
+    def bump(self, tags):
+        """Invalidate pages with any of the tags."""
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def stats(self):
+        return self._pages.stats()
+
+
+class FileSystemPageCache:
+    """
+    Page cache in a directory shared by all processes of the app.
+
+    Files are replaced atomically, so processes never read partly written pages.
+    When the directory holds over maxsize pages, the oldest ones are removed.
+    """
+
+    def __init__(self, directory, maxsize, ttl=None):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(directory, "tags"), exist_ok=True)
+
+    def _page_path(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".page"
+        )
+
+    def _tag_path(self, tag):
+        return os.path.join(self.directory, "tags", tag.replace(":", "-"))
+
+    def _write(self, path, data):
+        # a unique temporary name, since other processes may write the same file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        path = self._page_path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            if self.ttl is not None and mtime <= time.time() - self.ttl:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                page = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return page
+
+    def set(self, key, page):
+        if self.maxsize <= 0:
+            return
+        path = self._page_path(key)
+        self._write(path, pickle.dumps(page))
+        self._prune(keep=path)
+
+    def _prune(self, keep):
+        with os.scandir(self.directory) as entries:
+            pages = [
+                entry
+                for entry in entries
+                if entry.name.endswith(".page") and entry.path != keep
+            ]
+        # one slot is taken by the page just written
+        if len(pages) < self.maxsize:
+            return
+        pages.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in pages[: len(pages) - self.maxsize + 1]:
+            try:
+                os.remove(entry.path)
+                self.evictions += 1
+            except OSError:
+                # already removed by another process
+                pass
+
+    def tag_versions(self, tags):
+        versions = []
+        for tag in tags:
+            try:
+                with open(self._tag_path(tag), "rb") as f:
+                    versions.append(f.read())
+            except OSError:
+                versions.append(b"")
+        return tuple(versions)
+
+    def bump(self, tags):
+        for tag in tags:
+            self._write(self._tag_path(tag), uuid.uuid4().hex.encode())
+
+    def stats(self):
+        with os.scandir(self.directory) as entries:
+            size = sum(entry.name.endswith(".page") for entry in entries)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": size,
+            "maxsize": self.maxsize,
+        }
+
+
+def get_page_cache(app=None):
+    """Return the page cache of the app, or None if PAGE_CACHE is disabled."""
+    app = app or current_app._get_current_object()
+    backend = app.config["PAGE_CACHE"]
+    if not backend:
+        return None
+    cache = app.extensions.get("page_cache")
+    if cache is None:
+        size = app.config["PAGE_CACHE_SIZE"]
+        ttl = app.config["PAGE_CACHE_TTL"]
+        if backend == "memory":
+            cache = MemoryPageCache(size, ttl)
+        elif backend == "filesystem":
+            directory = app.config["PAGE_CACHE_DIR"] or os.path.join(
+                app.instance_path, "page_cache"
+            )
+            cache = FileSystemPageCache(directory, size, ttl)
+        else:
+            raise ValueError(f"Unknown PAGE_CACHE backend {backend!r}.")
+        cache = app.extensions.setdefault("page_cache", cache)
+    return cache
+
+
+def invalidate_pages(*tags):
+    """Drop cached pages with any of the tags, e.g. after a bulk UPDATE."""
+    cache = get_page_cache()
+    if cache is not None and tags:
+        cache.bump(tags)
+
+
+def cached_page(*tags):
+    """
+    View decorator caching the page for visitors who aren't logged in.
+
+    Args:
+        tags: tags of the page. Tags containing "{...}" are formatted with the
+            view's arguments, e.g. "topic:{id}".
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            cache = get_page_cache()
+            if (
+                cache is None
+                or g.user is not None
+                or request.method not in ("GET", "HEAD")
+                # flashed messages are shown once
+                or "_flashes" in session
+            ):
+                return view(**kwargs)
+
+            page_tags = [tag.format(**kwargs) for tag in tags]
+            # read before rendering, so changes committed meanwhile invalidate it
+            key = (request.url, cache.tag_versions(page_tags))
+            page = cache.get(key)
+            if page is not None:
+                response = current_app.response_class(
+                    page.body, status=page.status, headers=page.headers
+                )
+                response.headers["X-Cache"] = "HIT"
+                # the page may carry validators, see conditional.py
+                return response.make_conditional(request)
+
+            # render the page in full, see streaming.py
+            g.caching_page = True
+            read_from_primary(db.session)
+            response = current_app.make_response(view(**kwargs))
+            if (
+                response.status_code == 200
+                and not response.is_streamed
+                and "Set-Cookie" not in response.headers
+            ):
+                cache.set(
+                    key,
+                    CachedPage(
+                        response.get_data(),
+                        response.status_code,
+                        list(response.headers),
+                    ),
+                )
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+
+def _collect_tags(session, flush_context):
+    """Remember tags of the pages showing the flushed changes, until committed."""
+    tags = session.info.setdefault("page_cache", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Post):
+            tags.update((HOME_TAG, TOPICS_TAG, topic_tag(obj.topic_id)))
+            # a post moved to another topic changes both
+            for topic_id in db.inspect(obj).attrs.topic_id.history.deleted:
+                tags.add(topic_tag(topic_id))
+        elif isinstance(obj, Topic):
+            tags.update((HOME_TAG, TOPICS_TAG, topic_tag(obj.id)))
+        elif isinstance(obj, User) and obj not in session.new:
+            # new users aren't shown anywhere yet
+            tags.add(USERS_TAG)
+
+
+def _bump_tags(session):
+    tags = session.info.pop("page_cache", None)
+    if tags:
+        invalidate_pages(*tags)
+
+
+def _discard(session, previous_transaction):
+    session.info.pop("page_cache", None)
+
+
+db.event.listen(db.session, "after_flush", _collect_tags)
+db.event.listen(db.session, "after_commit", _bump_tags)
+db.event.listen(db.session, "after_soft_rollback", _discard)
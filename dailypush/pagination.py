@@ -0,0 +1,191 @@
+"""
+This module implements keyset (cursor) pagination.
+
+Instead of skipping OFFSET rows, every page is selected relative to the sort key of
+the last row shown, so deep pages cost the same as the first one, as long as an
+index matches the sort key. Links to neighbouring pages carry the sort key of the
+first or last row, encoded as an opaque cursor token.
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask_sqlalchemy.pagination import SelectPagination
+from werkzeug.exceptions import abort
+
+from dailypush import db
+
+
+def encode_cursor(*values):
+    """Encode sort key values (str, int or datetime) into a URL-safe token."""
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value for value in values
+    ]
+    data = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, *types):
+    """
+    Decode token created by encode_cursor.
+
+    Args:
+        token: the cursor token.
+        types: expected type of each value (str, int or datetime).
+
+    Raises:
+        ValueError: if the token is malformed.
+    """
+    try:
+        padding = "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(token + padding))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Unexpected number of cursor values.")
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for type_, value in zip(types, values)
+        )
+    except TypeError as e:
+        raise ValueError("Malformed cursor.") from e
+
+
+class KeysetPagination:
+    """
+    A page of results selected relative to a cursor, instead of by page number.
+
+    Can be used in templates like Flask-SQLAlchemy's Pagination (iterating, items,
+    has_prev, has_next), except it doesn't know the total or page numbers.
+    """
+
+    def __init__(
+        self, select, keys, per_page, before=None, after=None, desc=False, stream=False
+    ):
+        """
+        Args:
+            select: select statement of the rows, without ordering.
+            keys: columns making up a unique sort key, e.g. (Post.created, Post.id).
+            per_page: maximum number of items on a page.
+            before: key values of the first item on the next page, to get
+                the items shown before it.
+            after: key values of the last item on the previous page, to get
+                the items shown after it.
+            desc: whether the items are shown in descending order.
+            stream: fetch the items only while iterating, so they can be
+                rendered as they arrive (see streaming.py). has_next, items
+                and the cursors are then only known once iterated. Pages before
+                a cursor are fetched right away, as they're selected backwards.
+        """
+        self.keys = keys
+        self.per_page = per_page
+        key = db.tuple_(*keys)
+
+        # going back means walking the index in the opposite direction
+        backwards = before is not None
+        descending = desc != backwards
+        cursor = before if backwards else after
+        if cursor is not None:
+            cursor = db.tuple_(*cursor)
+            select = select.where(key < cursor if descending else key > cursor)
+        select = select.order_by(
+            *(column.desc() if descending else column.asc() for column in keys)
+        ).limit(per_page + 1)
+
+        if stream and not backwards:
+            self._select = select
+            self.has_prev, self.has_next = after is not None, False
+            self.items = []
+            return
+        self._select = None
+
+        rows = self._execute(select).all()
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+            self.has_prev, self.has_next = more, True
+        else:
+            self.has_prev, self.has_next = after is not None, more
+        self.items = rows
+
+    @staticmethod
+    def _execute(select):
+        result = db.session.execute(select)
+        # entities when selecting a model, rows when selecting columns
+        if len(select.column_descriptions) == 1:
+            result = result.scalars()
+        return result
+
+    def __iter__(self):
+        if self._select is None:
+            yield from self.items
+            return
+
+        select, self._select = self._select, None
+        result = self._execute(select.execution_options(yield_per=self.per_page))
+        try:
+            for row in result:
+                if len(self.items) == self.per_page:
+                    self.has_next = True
+                    break
+                self.items.append(row)
+                yield row
+        finally:
+            result.close()
+
+    def _cursor(self, item):
+        return encode_cursor(*(getattr(item, column.key) for column in self.keys))
+
+    @property
+    def prev_cursor(self):
+        """Cursor for the page before this one."""
+        return self._cursor(self.items[0]) if self.items and self.has_prev else None
+
+    @property
+    def next_cursor(self):
+        """Cursor for the page after this one."""
+        return self._cursor(self.items[-1]) if self.items and self.has_next else None
+
+
+class StreamedPagination(SelectPagination):
+    """
+    Page of a select by page number, like the one of db.paginate, with a known
+    total. The items are only fetched while iterating, so they can be rendered as
+    they arrive (see streaming.py).
+    """
+
+    def __init__(self, total, **kwargs):
+        """
+        Args:
+            total: total number of items, e.g. kept count, instead of counting them.
+            kwargs: arguments of db.paginate (select, page, per_page...), and session.
+        """
+        super().__init__(count=False, **kwargs)
+        self.total = total
+        if self.page > 1 and self.first == 0:
+            abort(404)
+
+    def _query_items(self):
+        # not fetched until iterated
+        return self._stream_items()
+
+    def _stream_items(self):
+        select = self._query_args["select"]
+        select = select.limit(self.per_page).offset(self._query_offset)
+        session = self._query_args["session"]
+        result = session.execute(
+            select.execution_options(yield_per=self.per_page)
+        ).scalars()
+        try:
+            yield from result
+        finally:
+            result.close()
+
+    # the number of items on the page follows from the total
+
+    @property
+    def first(self):
+        return self._query_offset + 1 if self.total > self._query_offset else 0
+
+    @property
+    def last(self):
+        return min(self.total, self._query_offset + self.per_page)
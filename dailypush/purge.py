@@ -0,0 +1,110 @@
+"""
+This module purges deleted users and topics from the database.
+
+Deleting a user or a topic only flags it (see User.soft_delete and
+Topic.soft_delete), which hides it and everything in it right away. The rows are
+removed later by `flask purge-deleted`, in small transactions: first posts of
+deleted topics, then the emptied topics, and finally users without topics left.
+That way, deleting a large account never holds locks for long.
+"""
+from datetime import datetime
+
+from dailypush import db
+from dailypush.models import User, Topic, Post, topic_stats_values
+from dailypush.search import remove_from_search_index
+
+
+def pending_deletions():
+    """Return the numbers of deleted users, topics and posts not purged yet."""
+    users = User.__table__
+    topics = Topic.__table__
+    row = db.session.execute(
+        db.select(
+            db.func.count(topics.c.id),
+            # kept up to date by purge_deleted
+            db.func.coalesce(db.func.sum(topics.c.post_count), 0),
+        ).where(topics.c.deleted_at.is_not(None))
+    ).one()
+    return {
+        "users": db.session.execute(
+            db.select(db.func.count(users.c.id)).where(users.c.deleted_at.is_not(None))
+        ).scalar(),
+        "topics": row[0],
+        "posts": row[1],
+    }
+
+
+def purge_deleted(limit=1000):
+    """
+    Purge a batch of deleted rows in one transaction: posts of deleted topics, or
+    else deleted topics without posts, or else deleted users without topics.
+
+    Returns:
+        The number of purged rows, 0 once there's nothing left to purge.
+    """
+    users = User.__table__
+    topics = Topic.__table__
+    posts = Post.__table__
+    deleted_topics = db.select(topics.c.id).where(topics.c.deleted_at.is_not(None))
+
+    rows = db.session.execute(
+        db.select(posts.c.id, posts.c.topic_id)
+        .where(posts.c.topic_id.in_(deleted_topics))
+        .limit(limit)
+    ).all()
+    if rows:
+        ids = [row.id for row in rows]
+        db.session.execute(db.delete(posts).where(posts.c.id.in_(ids)))
+        remove_from_search_index(db.session.connection(), posts, ids)
+        # keeps the count of posts left to purge
+        db.session.execute(
+            db.update(topics)
+            .where(topics.c.id.in_({row.topic_id for row in rows}))
+            .values(**topic_stats_values(topics))
+        )
+        db.session.commit()
+        return len(ids)
+
+    ids = (
+        db.session.execute(
+            deleted_topics.where(
+                ~db.exists().where(posts.c.topic_id == topics.c.id)
+            ).limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+    if ids:
+        db.session.execute(db.delete(topics).where(topics.c.id.in_(ids)))
+        remove_from_search_index(db.session.connection(), topics, ids)
+        # The latest `updated` time of all topics is the validator of pages listing
+        #   topics (see conditional.py), and mustn't go back to that of an earlier
+        #   version of those pages, so the latest remaining topic is bumped.
+        latest = db.session.execute(
+            db.select(topics.c.id).order_by(topics.c.updated.desc()).limit(1)
+        ).scalar()
+        if latest is not None:
+            db.session.execute(
+                db.update(topics)
+                .where(topics.c.id == latest)
+                .values(updated=datetime.utcnow())
+            )
+        db.session.commit()
+        return len(ids)
+
+    ids = (
+        db.session.execute(
+            db.select(users.c.id)
+            .where(
+                users.c.deleted_at.is_not(None),
+                ~db.exists().where(topics.c.author_id == users.c.id),
+            )
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+    if ids:
+        db.session.execute(db.delete(users).where(users.c.id.in_(ids)))
+        db.session.commit()
+    return len(ids)
@@ -0,0 +1,127 @@
+"""
+This module renders post bodies in the background.
+
+Unless RENDER_MODE is "sync", saving a post only stores its Markdown body and marks
+the post as pending. Pending posts form a queue in the database, which is drained
+either by a thread pool inside the app process (RENDER_MODE "thread"), or by one or
+more separate `flask render-worker` processes (RENDER_MODE "worker").
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from dailypush import db
+from dailypush.feed import get_feed
+from dailypush.models import Topic, Post
+from dailypush.page_cache import HOME_TAG, invalidate_pages, topic_tag
+from dailypush.rendering import cached_render_body, make_excerpt
+
+
+def render_pending_posts(limit=100):
+    """
+    Render a batch of pending posts, oldest first.
+
+    A post whose body changed while it was being rendered stays pending, so that
+    the next batch picks up the new body.
+
+    Returns:
+        The number of pending posts found.
+    """
+    posts = Post.__table__
+    select = (
+        db.select(posts.c.id, posts.c.topic_id, posts.c.body)
+        .where(posts.c.render_pending)
+        .order_by(posts.c.id)
+        .limit(limit)
+    )
+    rows = db.session.execute(select).all()
+    if not rows:
+        return 0
+
+    update = (
+        db.update(posts)
+        .where(
+            posts.c.id == db.bindparam("post_id"),
+            posts.c.body == db.bindparam("rendered_body"),
+        )
+        .values(
+            body_html=db.bindparam("rendered_html"),
+            body_excerpt_html=db.bindparam("rendered_excerpt"),
+            render_pending=False,
+        )
+    )
+    params = []
+    for row in rows:
+        body_html = cached_render_body(row.body)
+        params.append(
+            {
+                "post_id": row.id,
+                "rendered_body": row.body,
+                "rendered_html": body_html,
+                "rendered_excerpt": make_excerpt(body_html),
+            }
+        )
+    db.session.execute(update, params)
+    # pages of the topics changed, see conditional.py
+    topics = Topic.__table__
+    db.session.execute(
+        db.update(topics)
+        .where(topics.c.id.in_({row.topic_id for row in rows}))
+        .values(updated=datetime.utcnow())
+    )
+    db.session.commit()
+    # the bulk UPDATE bypasses session events, which keep the feed and cached
+    #   pages up to date
+    get_feed().evict(post_ids={row.id for row in rows})
+    invalidate_pages(HOME_TAG, *{topic_tag(row.topic_id) for row in rows})
+    return len(rows)
+
+
+def drain(app):
+    """Render pending posts until there are none left."""
+    with app.app_context():
+        while render_pending_posts():
+            pass
+
+
+def _get_executor(app):
+    executor = app.extensions.get("render_queue")
+    if executor is None:
+        executor = app.extensions["render_queue"] = ThreadPoolExecutor(
+            app.config["RENDER_THREADS"], thread_name_prefix="render"
+        )
+    return executor
+
+
+def _mark_pending(session, flush_context, instances):
+    """Remember whether the flushed changes added posts to the render queue."""
+    if any(
+        isinstance(obj, Post) and obj.render_pending
+        for obj in (*session.new, *session.dirty)
+    ):
+        session.info["render_pending"] = True
+
+
+def _dispatch(session):
+    """Hand the committed render queue over to the thread pool."""
+    if not session.info.pop("render_pending", False):
+        return
+    app = current_app._get_current_object()
+    if app.config["RENDER_MODE"] != "thread":
+        return
+
+    if app.config["RENDER_THREADS"]:
+        _get_executor(app).submit(drain, app)
+    else:
+        # render right away, e.g. in tests
+        drain(app)
+
+
+def _discard(session, previous_transaction):
+    session.info.pop("render_pending", None)
+
+
+db.event.listen(db.session, "before_flush", _mark_pending)
+db.event.listen(db.session, "after_commit", _dispatch)
+db.event.listen(db.session, "after_soft_rollback", _discard)
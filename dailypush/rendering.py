@@ -0,0 +1,338 @@
+"""
+This module converts post bodies from Markdown to sanitized HTML.
+
+Building the Markdown converter and bleach's cleaner and linker is relatively
+expensive, so every thread keeps its own instances and reuses them between posts.
+(None of them are thread-safe, hence per thread and not per process.)
+
+Rendering is also subject to a budget, since pathological Markdown (e.g. long runs
+of backticks, deeply nested lists) can take seconds or more to convert. Bodies over
+the size limit, or taking longer than the time limit, are shown as plain text.
+"""
+import hashlib
+import html
+import logging
+import multiprocessing
+import re
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from bleach.linkifier import Linker
+from bleach.sanitizer import Cleaner
+from markdown import Markdown
+
+from dailypush import constants
+from dailypush.utils import LRUCache, Replacer
+
+# Scale down headings in converted HTML.
+# Should be consistent with live preview.
+HEADING_REPLACEMENTS = {
+    "<h6>": "<h6>#### ",
+    "<h5>": "<h6>### ",
+    "</h5>": "</h6>",
+    "<h4>": "<h6>## ",
+    "</h4>": "</h6>",
+    "<h3>": "<h6># ",
+    "</h3>": "</h6>",
+    "<h2>": "<h6>",
+    "</h2>": "</h6>",
+    "<h1>": "<h5>",
+    "</h1>": "</h5>",
+}
+_heading_replacer = Replacer(HEADING_REPLACEMENTS, ignore_case=True)
+
+_local = threading.local()
+
+
+def _get_pipeline():
+    """Return the Markdown converter, cleaner and linker of the current thread."""
+    try:
+        return _local.pipeline
+    except AttributeError:
+        _local.pipeline = (
+            Markdown(output_format="html"),
+            Cleaner(tags=constants.ALLOWED_TAGS, strip=True),
+            Linker(),
+        )
+        return _local.pipeline
+
+
+def render_body(value):
+    """Convert post body from Markdown to sanitized HTML."""
+    md, cleaner, linker = _get_pipeline()
+    try:
+        body_html = md.convert(value)
+    finally:
+        # clear references, footnotes etc. collected from this post
+        md.reset()
+
+    body_html = _heading_replacer.replace(body_html)
+
+    return linker.linkify(cleaner.clean(body_html))
+
+
+# Opening, closing or void HTML tag, with possibly quoted attribute values
+_TAG_RE = re.compile(r"""<(/?)([a-zA-Z][a-zA-Z0-9]*)(?:[^>"']|"[^"]*"|'[^']*')*>""")
+_VOID_TAGS = frozenset({"br", "hr", "img", "wbr"})
+
+
+def make_excerpt(body_html, max_length=constants.EXCERPT_LENGTH):
+    """
+    Return the leading blocks of rendered post, for listing pages.
+
+    The HTML is only ever cut between top-level blocks (paragraphs, lists, code
+    blocks...), so the excerpt stays well-formed. It holds as many blocks as fit
+    in max_length characters of text, but at least the first one.
+
+    Returns:
+        The excerpt HTML, or None if the whole post is short enough.
+    """
+    depth = 0
+    text_length = 0
+    position = 0
+    cut = None
+    for match in _TAG_RE.finditer(body_html):
+        text_length += match.start() - position
+        position = match.end()
+        closing, tag = match.groups()
+        if tag.lower() not in _VOID_TAGS:
+            depth = max(depth - 1, 0) if closing else depth + 1
+        if depth:
+            continue
+        # end of a top-level block
+        if text_length > max_length:
+            cut = cut or position
+            break
+        cut = position
+    else:
+        # everything fits
+        return None
+
+    if not body_html[cut:].strip():
+        return None
+    return body_html[:cut]
+
+
+logger = logging.getLogger(__name__)
+
+
+def render_plain_text(value):
+    """Escape post body and keep its line breaks, without interpreting Markdown."""
+    return "<p>{}</p>".format(html.escape(value).replace("\n", "<br>\n"))
+
+
+class RenderTimeout(Exception):
+    """Raised when rendering takes longer than the time limit."""
+
+
+# Workers aren't forked from the app process, whose other threads may hold locks
+#   (logging, caches...) that would never be released in the child. A fork server
+#   with this module preloaded still starts them quickly.
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context("forkserver")
+    _context.set_forkserver_preload([__name__])
+else:  # pragma: no cover
+    _context = multiprocessing.get_context("spawn")
+
+
+def _render_worker(conn):
+    """Render post bodies received on conn, in a worker process, until it closes."""
+    while True:
+        try:
+            value = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, render_body(value)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class _Worker:
+    """A worker process, and the connection to send it post bodies."""
+
+    def __init__(self):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(
+            target=_render_worker, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class RenderPool:
+    """
+    Pool of worker processes rendering post bodies with a time limit.
+
+    Unlike threads, a process stuck on a single body can be killed. Every render
+    has a worker to itself, and when it times out only that worker is killed, and
+    replaced on next use; renders running in other workers are left alone. Waiting
+    for a free worker doesn't count against the time limit.
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self._idle = []
+        self._workers = set()
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        """Return an idle worker, starting one if there are fewer than processes."""
+        with self._condition:
+            while not self._idle and len(self._workers) >= self.processes:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            worker = _Worker()
+            self._workers.add(worker)
+            return worker
+
+    def _release(self, worker, alive=True):
+        with self._condition:
+            if alive and worker in self._workers:
+                self._idle.append(worker)
+            else:
+                self._workers.discard(worker)
+            self._condition.notify()
+
+    def render(self, value, timeout):
+        """Render post body in a worker process, raising RenderTimeout if too slow."""
+        worker = self._acquire()
+        try:
+            worker.conn.send(value)
+            # the worker was idle, so the clock starts as it gets the body
+            if not worker.conn.poll(timeout):
+                raise RenderTimeout()
+            ok, result = worker.conn.recv()
+        except BaseException:
+            worker.kill()
+            self._release(worker, alive=False)
+            raise
+        self._release(worker)
+        if not ok:
+            raise result
+        return result
+
+    def terminate(self):
+        """Kill the worker processes."""
+        with self._condition:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._idle.clear()
+            self._condition.notify_all()
+        for worker in workers:
+            worker.kill()
+
+
+# Worker processes for RENDER_TIMEOUT. Size is set from RENDER_PROCESSES.
+render_pool = RenderPool(constants.RENDER_PROCESSES)
+
+
+def render_within_budget(value, max_size=None, timeout=None):
+    """
+    Render post body, falling back to plain text when it exceeds the budget.
+
+    Args:
+        value: post body (Markdown).
+        max_size: maximum length of the body to render, in characters.
+        timeout: maximum rendering time in seconds. When set, rendering happens
+            in a worker process of render_pool, so it can be interrupted.
+    """
+    if max_size is not None and len(value) > max_size:
+        logger.warning(
+            "Post body of %d characters exceeds the render size limit of %d, "
+            "showing it as plain text.",
+            len(value),
+            max_size,
+        )
+        return render_plain_text(value)
+
+    if not timeout:
+        return render_body(value)
+
+    try:
+        return render_pool.render(value, timeout)
+    except RenderTimeout:
+        logger.warning(
+            "Rendering post body of %d characters took over %gs, "
+            "showing it as plain text.",
+            len(value),
+            timeout,
+        )
+        return render_plain_text(value)
+
+
+def render_body_and_excerpt(value, **budget):
+    """Render post body within budget, and return its HTML and excerpt HTML."""
+    body_html = render_within_budget(value, **budget)
+    return body_html, make_excerpt(body_html)
+
+
+def render_budget():
+    """Return the render budget keyword arguments from app config."""
+    if not has_app_context():
+        return {}
+    return {
+        "max_size": current_app.config["RENDER_MAX_BODY_SIZE"],
+        "timeout": current_app.config["RENDER_TIMEOUT"],
+    }
+
+
+# Rendered post bodies, keyed by content hash. Size is set from RENDER_CACHE_SIZE.
+render_cache = LRUCache(constants.RENDER_CACHE_SIZE)
+
+
+def cached_render_body(value):
+    """
+    Render post body, reusing the result for a body that was rendered before.
+
+    The cache key is a hash of the body text and the renderer version, so a change
+    of the rendering pipeline never serves stale HTML. Plain text fallbacks of bodies
+    over the render budget are cached too, so they don't hog the workers again.
+    """
+    key = hashlib.sha256(
+        f"{constants.RENDERER_VERSION}:{value}".encode("utf-8")
+    ).hexdigest()
+    body_html = render_cache.get(key)
+    if body_html is None:
+        body_html = render_within_budget(value, **render_budget())
+        render_cache.set(key, body_html)
+    return body_html
+
+
+def benchmark(bodies, rounds=1, render=render_body):
+    """
+    Measure rendering throughput over a corpus of post bodies.
+
+    Args:
+        bodies: list of post bodies (Markdown) to render.
+        rounds: how many times to render the whole corpus.
+        render: rendering function to measure.
+
+    Returns:
+        Dictionary with the number of rendered posts, total time in seconds,
+        posts per second, and median and 99th percentile render time in ms.
+    """
+    timings = []
+    for _ in range(rounds):
+        for body in bodies:
+            start = time.perf_counter()
+            render(body)
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        "posts": len(timings),
+        "seconds": total,
+        "posts_per_sec": len(timings) / total if total else 0.0,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p99_ms": timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000,
+    }
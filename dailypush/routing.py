@@ -0,0 +1,86 @@
+"""
+This module routes read-only database traffic to replicas.
+
+Replicas are binds in SQLALCHEMY_BINDS, listed by key in DATABASE_REPLICAS. While
+handling a GET (or HEAD, OPTIONS) request, the session reads from one of them,
+chosen round-robin per request. Everything else goes to the primary database:
+writes, reads of a session that already wrote, SELECT ... FOR UPDATE, work done
+outside of requests (CLI commands, background threads), and reads of data about to
+be cached (see read_from_primary).
+
+Replicas lag behind the primary, so after a request writes, the same visitor's
+requests keep reading from the primary for DATABASE_REPLICA_STICKINESS seconds,
+to see their own changes.
+"""
+import itertools
+import time
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def _replica_cycle(app):
+    cycle = app.extensions.get("replica_cycle")
+    if cycle is None:
+        cycle = app.extensions.setdefault(
+            "replica_cycle", itertools.cycle(app.config["DATABASE_REPLICAS"])
+        )
+    return cycle
+
+
+class RoutingSession(Session):
+    """Session sending reads of read-only requests to replica engines."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            if "replica" not in self.info:
+                self.info["replica"] = next(_replica_cycle(current_app))
+            return self._db.engines[self.info["replica"]]
+        if self._flushing or not isinstance(clause, sa.sql.Select):
+            # writes go to the primary, and so do the session's later reads,
+            #   to see its own changes
+            self.info["wrote"] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if (
+            self._flushing
+            or self.info.get("wrote")
+            or self.info.get("primary")
+            or not isinstance(clause, sa.sql.Select)
+            or clause._for_update_arg is not None
+            or not has_request_context()
+            or not current_app.config["DATABASE_REPLICAS"]
+        ):
+            return False
+        return (
+            request.method in READ_ONLY_METHODS
+            and session.get("primary_until", 0) <= time.time()
+        )
+
+
+def read_from_primary(db_session):
+    """
+    Make the rest of the session's reads go to the primary. Data which is cached
+    once read must be, since a lagging replica could still return rows from before
+    the changes that invalidated the cache.
+    """
+    db_session.info["primary"] = True
+
+
+def _stick_to_primary(db_session):
+    """Make the visitor read from the primary for a while after writing."""
+    if (
+        db_session.info.get("wrote")
+        and has_request_context()
+        and current_app.config["DATABASE_REPLICAS"]
+    ):
+        session["primary_until"] = (
+            time.time() + current_app.config["DATABASE_REPLICA_STICKINESS"]
+        )
+
+
+sa.event.listen(RoutingSession, "after_commit", _stick_to_primary)
@@ -0,0 +1,238 @@
+"""
+This module implements full-text search over posts and topics.
+
+The search index depends on the database backend:
+- MySQL has FULLTEXT indexes on the searched columns, queried with MATCH ... AGAINST.
+- SQLite has FTS5 shadow tables (posts_fts, topics_fts), kept in sync by ORM events.
+  Changes that bypass the ORM (bulk UPDATEs, `flask import`) should be followed by
+  `flask reindex-search`.
+- Other databases fall back to unranked LIKE scans.
+
+The indexes are created along with the tables by `flask init-db`, and by the
+migrations for existing databases.
+"""
+import re
+
+from sqlalchemy.dialects import mysql
+
+from dailypush import db
+from dailypush.models import Topic, Post
+
+# Indexed columns of each searchable table
+SEARCH_COLUMNS = {
+    Post.__table__.name: ("title", "body"),
+    Topic.__table__.name: ("name",),
+}
+
+# FTS5 shadow tables, in their own metadata so create_all doesn't make them
+#   ordinary tables
+_fts_metadata = db.MetaData()
+FTS_TABLES = {
+    name: db.Table(
+        f"{name}_fts",
+        _fts_metadata,
+        db.Column("rowid", db.Integer, primary_key=True),
+        *(db.Column(column, db.Text) for column in columns),
+    )
+    for name, columns in SEARCH_COLUMNS.items()
+}
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def search_terms(text):
+    """Split search text into words, ignoring punctuation and query syntax."""
+    return _WORD_RE.findall(text)
+
+
+def _columns(model):
+    return [getattr(model, name) for name in SEARCH_COLUMNS[model.__tablename__]]
+
+
+class LikeIndex:
+    """Search without an index, matching every word anywhere in the columns."""
+
+    def condition(self, model, text):
+        """Return WHERE clause selecting rows of model which match text."""
+        terms = search_terms(text)
+        if not terms:
+            return db.false()
+        columns = _columns(model)
+        return db.and_(
+            *(
+                db.or_(*(column.contains(term, autoescape=True) for column in columns))
+                for term in terms
+            )
+        )
+
+    def search(self, select, model, text):
+        """Filter select to rows of model matching text, best matches first."""
+        return select.where(self.condition(model, text)).order_by(model.id.desc())
+
+
+class Fts5Index(LikeIndex):
+    """Search in SQLite FTS5 shadow tables, ranked with BM25."""
+
+    def _match(self, model, text):
+        table = FTS_TABLES[model.__tablename__]
+        # quoted words can't be mistaken for FTS5 operators
+        query = " ".join(f'"{term}"' for term in search_terms(text))
+        return db.select(table.c.rowid, db.literal_column("rank")).where(
+            db.literal_column(table.name).op("MATCH")(query)
+        )
+
+    def condition(self, model, text):
+        if not search_terms(text):
+            return db.false()
+        return model.id.in_(
+            self._match(model, text).with_only_columns(
+                FTS_TABLES[model.__tablename__].c.rowid
+            )
+        )
+
+    def search(self, select, model, text):
+        if not search_terms(text):
+            return select.where(db.false())
+        matches = self._match(model, text).subquery()
+        # lower rank is better
+        return select.join(matches, matches.c.rowid == model.id).order_by(
+            matches.c.rank, model.id.desc()
+        )
+
+
+class MySQLFulltextIndex(LikeIndex):
+    """Search using MySQL FULLTEXT indexes, ranked by relevance."""
+
+    def _match(self, model, text):
+        # every word is required, as with the other indexes
+        query = " ".join(f"+{term}" for term in search_terms(text))
+        return mysql.match(*_columns(model), against=query).in_boolean_mode()
+
+    def condition(self, model, text):
+        if not search_terms(text):
+            return db.false()
+        return self._match(model, text)
+
+    def search(self, select, model, text):
+        if not search_terms(text):
+            return select.where(db.false())
+        relevance = self._match(model, text)
+        return select.where(relevance).order_by(relevance.desc(), model.id.desc())
+
+
+_INDEXES = {"sqlite": Fts5Index(), "mysql": MySQLFulltextIndex()}
+
+
+def get_search_index():
+    """Return the search index of the database in use."""
+    return _INDEXES.get(db.engine.dialect.name, LikeIndex())
+
+
+def _add_index_ddl(table, columns):
+    """Create the search index along with table, and drop it along with it."""
+    column_list = ", ".join(columns)
+    db.event.listen(
+        table,
+        "after_create",
+        db.DDL(
+            f"CREATE VIRTUAL TABLE {table.name}_fts USING fts5({column_list})"
+        ).execute_if(dialect="sqlite"),
+    )
+    db.event.listen(
+        table,
+        "after_create",
+        db.DDL(
+            f"CREATE FULLTEXT INDEX ix_{table.name}_fulltext"
+            f" ON {table.name} ({column_list})"
+        ).execute_if(dialect="mysql"),
+    )
+    db.event.listen(
+        table,
+        "before_drop",
+        db.DDL(f"DROP TABLE IF EXISTS {table.name}_fts").execute_if(dialect="sqlite"),
+    )
+
+
+_add_index_ddl(Post.__table__, SEARCH_COLUMNS[Post.__tablename__])
+_add_index_ddl(Topic.__table__, SEARCH_COLUMNS[Topic.__tablename__])
+
+
+def rebuild_search_index(connection):
+    """Refill the FTS5 shadow tables from scratch (nothing to do on other backends)."""
+    if connection.dialect.name != "sqlite":
+        return
+    for name, columns in SEARCH_COLUMNS.items():
+        source = db.metadata.tables[name]
+        table = FTS_TABLES[name]
+        connection.execute(table.delete())
+        connection.execute(
+            table.insert().from_select(
+                ["rowid", *columns],
+                db.select(source.c.id, *(source.c[column] for column in columns)),
+            )
+        )
+
+
+def remove_from_search_index(connection, table, ids):
+    """Remove rows of table deleted bypassing the ORM from the search index."""
+    if connection.dialect.name != "sqlite":
+        return
+    fts_table = FTS_TABLES[table.name]
+    connection.execute(fts_table.delete().where(fts_table.c.rowid.in_(ids)))
+
+
+def _index_inserted(mapper, connection, target):
+    if connection.dialect.name != "sqlite":
+        return
+    table = FTS_TABLES[mapper.local_table.name]
+    columns = SEARCH_COLUMNS[mapper.local_table.name]
+    connection.execute(
+        table.insert().values(
+            rowid=target.id, **{column: getattr(target, column) for column in columns}
+        )
+    )
+
+
+def _index_updated(mapper, connection, target):
+    if connection.dialect.name != "sqlite":
+        return
+    state = db.inspect(target)
+    # only the changed columns, which are loaded; deferred bodies may not be
+    values = {
+        column: getattr(target, column)
+        for column in SEARCH_COLUMNS[mapper.local_table.name]
+        if state.attrs[column].history.has_changes()
+    }
+    if values:
+        table = FTS_TABLES[mapper.local_table.name]
+        connection.execute(
+            table.update().where(table.c.rowid == target.id).values(**values)
+        )
+
+
+def _unindex_deleted(mapper, connection, target):
+    if connection.dialect.name != "sqlite":
+        return
+    table = FTS_TABLES[mapper.local_table.name]
+    connection.execute(table.delete().where(table.c.rowid == target.id))
+
+
+def _unindex_topic_posts(mapper, connection, target):
+    """Remove posts of a deleted topic, which the database deletes by cascade."""
+    if connection.dialect.name != "sqlite":
+        return
+    table = FTS_TABLES[Post.__tablename__]
+    connection.execute(
+        table.delete().where(
+            table.c.rowid.in_(db.select(Post.id).where(Post.topic_id == target.id))
+        )
+    )
+
+
+db.event.listen(Post, "after_insert", _index_inserted)
+db.event.listen(Post, "after_update", _index_updated)
+db.event.listen(Post, "after_delete", _unindex_deleted)
+db.event.listen(Topic, "after_insert", _index_inserted)
+db.event.listen(Topic, "after_update", _index_updated)
+db.event.listen(Topic, "after_delete", _unindex_deleted)
+db.event.listen(Topic, "before_delete", _unindex_topic_posts)
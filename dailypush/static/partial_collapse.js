@@ -7,10 +7,34 @@ function toggleShowMore(btn) {
     btn.innerHTML == "&nbsp;Show more" ? "&nbsp;Show less" : "&nbsp;Show more";
 }
 
+async function toggleFullPost(event, btn) {
+  /**
+   * Swaps an excerpt of a long blog entry for the full entry, and back.
+   * The full entry is fetched from the server on first use.
+   */
+  event.preventDefault();
+  const post_body = btn.closest(".post").querySelector(".post-body");
+
+  if (!("fullHtml" in btn.dataset)) {
+    const response = await fetch(btn.href);
+    if (!response.ok) return;
+    btn.dataset.excerptHtml = post_body.innerHTML;
+    btn.dataset.fullHtml = await response.text();
+  }
+
+  const expanded = btn.getAttribute("aria-expanded") == "true";
+  post_body.innerHTML = expanded ? btn.dataset.excerptHtml : btn.dataset.fullHtml;
+  btn.setAttribute("aria-expanded", !expanded);
+  toggleShowMore(btn);
+}
+
 function makeExpandable(post) {
   /**
    * Makes long blog entries expandable on a button click.
    */
+  // excerpts of long entries are expanded by toggleFullPost
+  if (post.querySelector(".full-post-link")) return;
+
   post_body = post.querySelector(".card-body");
   font_size = parseFloat(getComputedStyle(post_body)["font-size"]);
   height = post_body.offsetHeight / font_size;
@@ -0,0 +1,74 @@
+"""
+This module streams pages to the browser while their templates are rendered.
+
+With STREAM_PAGES enabled, pages rendered with render_page are sent in chunks:
+everything up to the {{ stream_flush }} spot in base.html (head, navigation bar
+and page header) goes out right away, and posts follow as they're fetched from
+the database (see StreamedPagination and KeysetPagination). That lowers the time
+to first byte of large pages, and the whole page is never held in memory.
+
+If the browser accepts gzip, the stream is compressed on the fly, and flushed
+after every chunk so the browser can show it without waiting for the rest.
+
+Pages about to be stored in the page cache are rendered in full instead, since
+only complete pages can be cached. The response starts before rendering ends,
+so an error while rendering truncates the page instead of showing an error page.
+"""
+import zlib
+
+from flask import current_app, g, render_template, request, stream_template
+from markupsafe import Markup
+
+from dailypush import constants
+
+# Rendered where the page so far should be sent, without waiting for a full chunk
+FLUSH_MARKER = Markup("<!-- flush -->")
+
+
+def _chunks(pieces, size):
+    """Join the rendered pieces of a template into chunks of about size characters."""
+    buffer = []
+    length = 0
+    for piece in pieces:
+        if piece != FLUSH_MARKER:
+            buffer.append(piece)
+            length += len(piece)
+            if length < size:
+                continue
+        if buffer:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _gzip(chunks, charset):
+    compressor = zlib.compressobj(
+        constants.STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    for chunk in chunks:
+        # a sync flush lets the browser decompress everything received so far
+        yield compressor.compress(chunk.encode(charset)) + compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+    yield compressor.flush()
+
+
+def render_page(template_name, **context):
+    """Render a page like render_template, or stream it if STREAM_PAGES is on."""
+    if not current_app.config["STREAM_PAGES"] or g.get("caching_page"):
+        return render_template(template_name, **context)
+
+    chunks = _chunks(
+        stream_template(template_name, stream_flush=FLUSH_MARKER, **context),
+        constants.STREAM_CHUNK_SIZE,
+    )
+    response = current_app.response_class(mimetype="text/html")
+    if request.accept_encodings["gzip"]:
+        response.response = _gzip(chunks, response.charset)
+        response.content_encoding = "gzip"
+    else:
+        response.response = chunks
+    response.vary.add("Accept-Encoding")
+    return response
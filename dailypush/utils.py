@@ -1,4 +1,103 @@
+import functools
+import itertools
+import math
 import re
+import threading
+import time
+from collections import OrderedDict
+
+
+# Upper limit of precomputed spellings per key of a case insensitive Replacer
+_MAX_CASE_VARIANTS = 256
+
+
+def _case_variants(key):
+    """Return all upper and lower case spellings of key, or none if too many."""
+    options = [{char.lower(), char.upper()} for char in key]
+    if math.prod(map(len, options)) > _MAX_CASE_VARIANTS:
+        return []
+    return ["".join(chars) for chars in itertools.product(*options)]
+
+
+class Replacer:
+    """
+    Precompiled multi-pattern replacer, built once for a replacement map.
+
+    All keys are combined into a single regex, and the string is split on it, so the
+    matches can be replaced with plain dictionary lookups instead of calling
+    a Python function per match. For case insensitive matching, the lookup table
+    also contains the upper and lower case spellings of every key, so matches don't
+    need to be normalized one by one.
+
+    Based on: https://gist.github.com/bgusach/a967e0587d6e01e889fd1d776c5f3729
+    """
+
+    def __init__(self, replacements, ignore_case=False):
+        """
+        :param dict replacements: replacement dictionary {value to find: value to replace}
+        :param bool ignore_case: whether the match should be case insensitive
+        """
+        if ignore_case:
+            # with {"HEY": "lol"} we should match "hey", "HEY", "hEy", etc.,
+            # so keys differing only in case are the same key
+            replacements = {key.lower(): val for key, val in replacements.items()}
+        self._replacements = replacements
+
+        if not replacements:
+            # Edge case that'd produce a regex matching the empty string
+            self._pattern = None
+            return
+
+        # Place longer ones first to keep shorter substrings from matching where the longer ones should take place
+        # For instance given the replacements {'ab': 'AB', 'abc': 'ABC'} against the string 'hey abc', it should produce
+        # 'hey ABC' and not 'hey ABc'
+        keys = sorted(replacements, key=len, reverse=True)
+        # a single group around all the keys keeps the regex engine's literal prefix
+        #   optimizations working, and makes split() return the matches too
+        self._pattern = re.compile(
+            "({})".format("|".join(map(re.escape, keys))),
+            re.IGNORECASE if ignore_case else 0,
+        )
+
+        if ignore_case:
+            self._lookup = {}
+            for key, val in replacements.items():
+                for variant in _case_variants(key):
+                    self._lookup.setdefault(variant, val)
+        else:
+            self._lookup = replacements
+
+    def replace(self, string):
+        """Return the string with all the replacements applied."""
+        if self._pattern is None:
+            return string
+
+        # text between the matches ends up on even, and the matches on odd positions
+        parts = self._pattern.split(string)
+        lookup = self._lookup
+        try:
+            parts[1::2] = [lookup[match] for match in parts[1::2]]
+        except KeyError:
+            # a spelling that wasn't precomputed, so fall back to normalizing
+            parts[1::2] = [self._replacements[match.lower()] for match in parts[1::2]]
+        return "".join(parts)
+
+    __call__ = replace
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_replacer(items, ignore_case):
+    return Replacer(dict(items), ignore_case)
+
+
+def get_replacer(replacements, ignore_case=False):
+    """
+    Return a compiled Replacer for the replacement map, reusing a recently built one.
+
+    Intended for ad-hoc callers; code that applies the same map repeatedly should
+    keep its own Replacer instead.
+    """
+    return _cached_replacer(tuple(replacements.items()), ignore_case)
 
 
 def multireplace(string, replacements, ignore_case=False):
@@ -7,42 +106,96 @@ def multireplace(string, replacements, ignore_case=False):
     :param str string: string to execute replacements on
     :param dict replacements: replacement dictionary {value to find: value to replace}
     :param bool ignore_case: whether the match should be case insensitive
+    """
+    return get_replacer(replacements, ignore_case).replace(string)
+
 
-    Source: https://gist.github.com/bgusach/a967e0587d6e01e889fd1d776c5f3729
+class LRUCache:
     """
-    if not replacements:
-        # Edge case that'd produce a funny regex and cause a KeyError
-        return string
+    Bounded, thread-safe least-recently-used cache.
+
+    Keeps hit, miss and eviction counters, so the effectiveness of the cache
+    can be inspected at runtime. A cache with maxsize 0 stores nothing. With a ttl,
+    entries also expire that many seconds after they were stored.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # values are stored with their expiry time (None if they don't expire)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-    # If case insensitive, we need to normalize the old string so that later a replacement
-    # can be found. For instance with {"HEY": "lol"} we should match and find a replacement for "hey",
-    # "HEY", "hEy", etc.
-    if ignore_case:
+    def __len__(self):
+        return len(self._data)
 
-        def normalize_old(s):
-            return s.lower()
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
 
-        re_mode = re.IGNORECASE
+    def get(self, key, default=None):
+        """Return the cached value for key, marking it as recently used."""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
 
-    else:
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries."""
+        if self.maxsize <= 0:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            self._evict()
 
-        def normalize_old(s):
-            return s
+    def pop(self, key, default=None):
+        """Remove key from the cache and return its value."""
+        with self._lock:
+            entry = self._lookup(key)
+            self._data.pop(key, None)
+            return default if entry is None else entry[0]
 
-        re_mode = 0
+    def clear(self):
+        """Drop all entries and reset the statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
 
-    replacements = {normalize_old(key): val for key, val in replacements.items()}
+    def resize(self, maxsize):
+        """Change the maximum number of entries, evicting any overflow."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
 
-    # Place longer ones first to keep shorter substrings from matching where the longer ones should take place
-    # For instance given the replacements {'ab': 'AB', 'abc': 'ABC'} against the string 'hey abc', it should produce
-    # 'hey ABC' and not 'hey ABc'
-    rep_sorted = sorted(replacements, key=len, reverse=True)
-    rep_escaped = map(re.escape, rep_sorted)
+    def stats(self):
+        """Return a dictionary with the current cache statistics."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
 
-    # Create a big OR regex that matches any of the substrings to replace
-    pattern = re.compile("|".join(rep_escaped), re_mode)
+    def _lookup(self, key):
+        # caller must hold the lock; drops the entry if it expired
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
 
-    # For each match, look up the new string in the replacements, being the key the normalized old string
-    return pattern.sub(
-        lambda match: replacements[normalize_old(match.group(0))], string
-    )
+    def _evict(self):
+        # caller must hold the lock
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
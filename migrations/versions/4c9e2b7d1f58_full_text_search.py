@@ -0,0 +1,47 @@
+"""Full-text search indexes of posts and topics.
+
+Revision ID: 4c9e2b7d1f58
+Revises: 8b2f4d6e1a37
+Create Date: 2026-10-18 16:02:47.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9e2b7d1f58'
+down_revision = '8b2f4d6e1a37'
+branch_labels = None
+depends_on = None
+
+# indexed columns of each table, see dailypush/search.py
+SEARCH_COLUMNS = {'posts': ('title', 'body'), 'topics': ('name',)}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCH_COLUMNS.items():
+        column_list = ', '.join(columns)
+        if dialect == 'mysql':
+            op.create_index(
+                f'ix_{table}_fulltext', table, list(columns), mysql_prefix='FULLTEXT'
+            )
+        elif dialect == 'sqlite':
+            # shadow tables, filled with the existing rows
+            op.execute(
+                f'CREATE VIRTUAL TABLE {table}_fts USING fts5({column_list})'
+            )
+            op.execute(
+                f'INSERT INTO {table}_fts (rowid, {column_list})'
+                f' SELECT id, {column_list} FROM {table}'
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_COLUMNS:
+        if dialect == 'mysql':
+            op.drop_index(f'ix_{table}_fulltext', table_name=table)
+        elif dialect == 'sqlite':
+            op.execute(f'DROP TABLE {table}_fts')
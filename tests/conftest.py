@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from datetime import datetime
 
 import pytest
@@ -5,6 +6,7 @@ from werkzeug.security import generate_password_hash
 
 from dailypush import create_app
 from dailypush import db, init_db
+from dailypush.instrumentation import collect_queries
 from dailypush.models import User, Topic, Post
 
 _admin_pass = generate_password_hash("validUser#3")
@@ -94,3 +96,22 @@ class AuthActions(object):
 @pytest.fixture
 def auth(client):
     return AuthActions(client)
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Check that the code in a with block issues at most the given number of SQL
+    queries, e.g. `with query_budget(2): client.get("/")`.
+    """
+
+    @contextmanager
+    def check(max_queries):
+        with collect_queries() as stats:
+            yield stats
+        assert stats.count <= max_queries, (
+            f"{stats.count} queries, over the budget of {max_queries}:",
+            stats.fingerprints,
+        )
+
+    return check
@@ -0,0 +1,158 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from dailypush.assets import minify_css, minify_js
+
+
+@pytest.fixture
+def static_folder(app, tmp_path):
+    """A copy of the static folder, to build into."""
+    folder = tmp_path / "static"
+    shutil.copytree(app.static_folder, folder, ignore=shutil.ignore_patterns("build"))
+    app.static_folder = str(folder)
+    return folder
+
+
+def built_url(client, name):
+    match = re.search(rf'"(/static/build/{name}\.\w+\.\w+)"', client.get("/").text)
+    return match and match.group(1)
+
+
+def test_minify_js():
+    source = """
+    // leading comment
+    var text = "// not a comment /* either */";   /* block
+       comment */
+    var re = /[/*]+\\/ "/g, half = total / 2 / count;
+    if (done)
+        return `  ${text}  `;
+    """
+    assert minify_js(source) == (
+        'var text = "// not a comment /* either */";\n'
+        'var re = /[/*]+\\/ "/g, half = total / 2 / count;\n'
+        "if (done)\n"
+        "return `  ${text}  `;\n"
+    )
+
+
+def test_minify_css():
+    source = """
+    /* header */
+    a:hover ,  .post > p {
+      color : red;
+      content: "  /* kept */  ";
+    }
+    """
+    assert minify_css(source) == (
+        'a:hover,.post>p{color :red;content:"  /* kept */  "}\n'
+    )
+
+
+def test_build_and_serve(app, client, runner, static_folder):
+    result = runner.invoke(args=["build-assets"])
+    assert re.search(
+        r"style\.css -> build/style\.\w{12}\.css \(.+ gzipped\)", result.output
+    )
+    assert (static_folder / "build" / "manifest.json").exists()
+
+    url = built_url(client, "style")
+    assert url
+    built = (static_folder / url.removeprefix("/static/")).read_bytes()
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "text/css"
+    assert "Accept-Encoding" in response.vary
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert gzip.decompress(response.data) == built
+
+    response = client.get(url)
+    assert "Content-Encoding" not in response.headers
+    assert response.data == built
+
+    # the original files are still there, with the usual cache headers
+    response = client.get("/static/style.css")
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+
+
+def test_rebuild_keeps_previous(runner, static_folder):
+    runner.invoke(args=["build-assets"])
+    first = set(os.listdir(static_folder / "build"))
+    for version in ("v2", "v3"):
+        with open(static_folder / "topics.js", "a") as f:
+            f.write(f"var version = '{version}';\n")
+        runner.invoke(args=["build-assets"])
+
+    names = set(os.listdir(static_folder / "build"))
+    assert len([name for name in names if re.match(r"topics\.\w+\.js$", name)]) == 2
+    assert first - names == {
+        name for name in first if re.match(r"topics\.\w+\.js(\.gz|\.br)?$", name)
+    }
+
+
+def test_built_assets_disabled(app, client, runner, static_folder):
+    runner.invoke(args=["build-assets"])
+    app.config["BUILT_ASSETS"] = False
+    assert built_url(client, "style") is None
+    assert 'href="/static/style.css"' in client.get("/").text
+
+
+# Two posts expanded in quick succession, their bodies fetched in the same order
+_TOGGLE_SCRIPT = """
+const fs = require("fs");
+globalThis.document = { querySelectorAll: () => [] };
+const pending = [];
+globalThis.fetch = (url) =>
+  new Promise((resolve) =>
+    pending.push(() => resolve({ ok: true, text: async () => `${url} full` }))
+  );
+eval(fs.readFileSync(process.argv[1], "utf8"));
+
+function makePost(id) {
+  const body = { innerHTML: `${id} excerpt` };
+  const attributes = {};
+  const btn = {
+    href: id,
+    dataset: {},
+    innerHTML: "&nbsp;Show more",
+    classList: { toggle() {} },
+    getAttribute: (name) => attributes[name] ?? null,
+    setAttribute: (name, value) => (attributes[name] = String(value)),
+    closest: () => ({ querySelector: () => body }),
+  };
+  return { body, btn };
+}
+
+const posts = [makePost("a"), makePost("b")];
+const event = { preventDefault() {} };
+const clicks = posts.map((post) => toggleFullPost(event, post.btn));
+pending.forEach((respond) => respond());
+Promise.all(clicks).then(() =>
+  console.log(
+    JSON.stringify(posts.map((post) => [post.body.innerHTML, post.btn.dataset]))
+  )
+);
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs Node.js")
+def test_expand_posts_concurrently(app):
+    script = os.path.join(app.static_folder, "partial_collapse.js")
+    result = subprocess.run(
+        ["node", "-e", _TOGGLE_SCRIPT, script],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    assert json.loads(result.stdout) == [
+        [id + " full", {"excerptHtml": id + " excerpt", "fullHtml": id + " full"}]
+        for id in ("a", "b")
+    ]
@@ -2,6 +2,7 @@ import pytest
 from flask import g, session
 
 from dailypush import db
+from dailypush.instrumentation import collect_queries
 from dailypush.models import User
 
 
@@ -97,6 +98,32 @@ def test_admin(client, auth):
     auth.login("john", "validUser#3")
     response = client.get("/admin", follow_redirects=True)
     assert "Welcome admin" in response.text
+    assert "Render cache" in response.text
+
+
+@pytest.mark.parametrize("model", ("user", "topic", "post"))
+def test_admin_list_columns(client, auth, model):
+    auth.login("john", "validUser#3")
+    with collect_queries() as stats:
+        response = client.get(f"/admin/{model}/")
+    assert response.status_code == 200
+    selects = [s for s in stats.fingerprints if s.startswith("SELECT")]
+    # no bodies, and no users joined to posts through their topics
+    assert not any("posts.body" in s for s in selects)
+    assert not any("JOIN users" in s and "FROM posts" in s for s in selects)
+
+
+def test_admin_approximate_count(app, client, auth):
+    auth.login("john", "validUser#3")
+    assert "List (2)" in client.get("/admin/post/").text
+
+    app.config["ADMIN_EXACT_COUNT_LIMIT"] = 1
+    response = client.get("/admin/post/")
+    assert "List (1+)" in response.text
+    assert "public post title" in response.text
+    # filtered lists are counted the same way
+    assert "List (1)" in client.get("/admin/post/?flt0_0=public").text
+    assert "List (1+)" in client.get("/admin/topic/?search=topic").text
 
 
 def test_logout(client, auth):
@@ -105,3 +132,49 @@ def test_logout(client, auth):
     with client:
         auth.logout()
         assert "user_id" not in session
+
+
+def count_user_selects(client, path="/topics"):
+    with collect_queries() as stats:
+        response = client.get(path)
+    return sum("FROM users" in statement for statement in stats.statements), response
+
+
+def test_user_cache(app, client, auth):
+    auth.login()
+    count, response = count_user_selects(client)
+    assert count == 1
+    assert "Hello, test." in response.text
+    # the user snapshot is reused by later requests
+    count, response = count_user_selects(client)
+    assert count == 0
+    assert "Hello, test." in response.text
+
+    app.config["USER_CACHE_SIZE"] = 0
+    app.extensions.pop("user_cache")
+    assert count_user_selects(client)[0] == 1
+    assert count_user_selects(client)[0] == 1
+
+
+def test_user_cache_invalidation(app, client, auth):
+    # cache snapshots of both users
+    auth.login()
+    client.get("/topics")
+    auth.login("other", "validUser#2")
+    client.get("/topics")
+
+    auth.login("john", "validUser#3")
+    client.post(
+        "/admin/user/edit/?id=1", data={"username": "renamed", "topics": ["1", "3"]}
+    )
+    client.post("/admin/user/delete/", data={"id": "2"})
+
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    assert "Hello, renamed." in client.get("/topics").text
+    # a deleted user is logged out
+    with client.session_transaction() as session:
+        session["user_id"] = 2
+    response_text = client.get("/").text
+    assert "Hello, other." not in response_text
+    assert "Log In" in response_text
@@ -1,7 +1,11 @@
-import pytest
+import html
+import re
 from datetime import datetime
 
+import pytest
+
 from dailypush import db, moment
+from dailypush.instrumentation import collect_queries
 from dailypush.models import Topic, Post, User
 
 
@@ -47,6 +51,148 @@ def test_topics(client, auth):
     assert client.post("/create_post/2").status_code == 403
 
 
+def test_topics_sort(app, client, auth):
+    with app.app_context():
+        db.session.add(Post(title="new", body="new", topic_id=1))
+        db.session.commit()
+
+    auth.login()
+    response_text = client.get("/topics").text
+    assert response_text.index("test topic") < response_text.index("public topic")
+    assert "2 entries" in response_text
+    response_text = client.get("/topics?sort=activity").text
+    assert response_text.index("test topic") < response_text.index("public topic")
+    assert 'href="/topics?filter=public&amp;sort=activity"' in response_text
+
+    with app.app_context():
+        db.session.add(Post(title="newer", body="newer", topic_id=3))
+        db.session.commit()
+    response_text = client.get("/topics?sort=activity").text
+    assert response_text.index("public topic") < response_text.index("test topic")
+
+
+def test_topics_pagination(app, client, auth):
+    with app.app_context():
+        db.session.add_all(
+            Topic(name=f"topic {i:02}", author_id=1, is_public=True) for i in range(30)
+        )
+        db.session.commit()
+
+    response_text = client.get("/topics?filter=public&sort=name").text
+    assert "public topic" in response_text
+    assert "topic 18" in response_text
+    assert "topic 19" not in response_text
+    next_url = re.search(r'href="([^"]*)">Next<', response_text).group(1)
+    assert "sort=name" in next_url
+
+    response_text = client.get(html.unescape(next_url)).text
+    assert "topic 18" not in response_text
+    assert "topic 19" in response_text
+    assert "topic 29" in response_text
+    assert ">Next<" not in response_text
+    prev_url = re.search(r'href="([^"]*)">Previous<', response_text).group(1)
+
+    response_text = client.get(html.unescape(prev_url)).text
+    assert "public topic" in response_text
+    assert "topic 18" in response_text
+    assert ">Previous<" not in response_text
+
+    assert client.get("/topics?after=garbage").status_code == 400
+
+
+def test_topics_name_filter(app, client, auth):
+    with app.app_context():
+        db.session.add(Topic(name="100% pure", author_id=1, is_public=True))
+        db.session.commit()
+
+    response_text = client.get("/topics?filter=public&q=PUBLIC").text
+    assert "public topic" in response_text
+    assert "100% pure" not in response_text
+    # wildcards are matched literally
+    response_text = client.get("/topics?filter=public&q=0%25").text
+    assert "100% pure" in response_text
+    assert "public topic" not in response_text
+    response_text = client.get("/topics?filter=public&q=nothing").text
+    assert "No topics match the filter." in response_text
+
+
+def test_topics_columns(client):
+    """The topics list only selects the columns shown on topic cards."""
+    with collect_queries() as stats:
+        assert client.get("/topics?filter=public").status_code == 200
+
+    statements = stats.statements
+    # the page's validator, then the list
+    assert len(statements) == 2
+    assert "max(topics.updated)" in statements[0]
+    assert "users.hash" not in statements[1]
+    assert "topics.is_public," not in statements[1]
+
+
+@pytest.mark.parametrize(
+    ("path", "login"),
+    (
+        ("/", False),
+        ("/topics/1", True),
+        ("/topics/3", True),
+        ("/posts/2/body", False),
+        ("/admin/post/", True),
+    ),
+)
+def test_raw_body_not_loaded(app, client, auth, path, login):
+    """Read pages only load rendered HTML of posts, not their Markdown."""
+    if login:
+        auth.login("john", "validUser#3") if path.startswith("/admin") else auth.login()
+    if path == "/topics/3":
+        app.config["TOPIC_PAGINATION"] = "keyset"
+    with collect_queries() as stats:
+        assert client.get(path).status_code == 200
+
+    assert stats.statements
+    for statement in stats.statements:
+        assert not re.search(r"posts\.body( AS posts_body|,|\s+FROM)", statement)
+
+
+def test_update_post_loads_body(app, client, auth):
+    auth.login()
+    assert "test\nbody" in client.get("/update_post/1").text
+    auth.login("john", "validUser#3")
+    assert "test\nbody" in client.get("/admin/post/edit/?id=1").text
+
+
+@pytest.mark.parametrize(
+    ("path", "login", "budget"),
+    (
+        # pages answering conditional requests check their validator first
+        ("/", False, 2),
+        ("/topics?filter=public", False, 2),
+        ("/topics?filter=personal&sort=activity", True, 2),
+        ("/topics/1", True, 3),
+        ("/topics/3", True, 3),
+        ("/posts/2/body", False, 1),
+        ("/update_post/1", True, 1),
+    ),
+)
+def test_query_budget(app, client, auth, query_budget, path, login, budget):
+    # enough posts and topics for an N+1 pattern to show
+    with app.app_context():
+        db.session.add_all(
+            Topic(name=f"topic {i}", author_id=1 + i % 2, is_public=True)
+            for i in range(10)
+        )
+        db.session.add_all(
+            Post(title=f"post {i}", body="body", topic_id=1 + i % 3) for i in range(30)
+        )
+        db.session.commit()
+    if login:
+        auth.login()
+        # load the user snapshot, which later requests reuse
+        client.get("/topics")
+
+    with query_budget(budget):
+        assert client.get(path).status_code == 200
+
+
 def test_topic(app, client, auth):
     # get inserted datetime in local time
     with app.app_context():
@@ -59,6 +205,41 @@ def test_topic(app, client, auth):
     assert local_time in response_text
     assert "test\nbody" in response_text
     assert 'href="/update_post/1"' in response_text
+    # the total comes from the topic's post count
+    assert "Showing entries 1 to 1 of 1" in response_text
+
+
+def test_topic_keyset_pagination(app, client, auth):
+    app.config["TOPIC_PAGINATION"] = "keyset"
+    with app.app_context():
+        db.session.add_all(
+            Post(title=f"post {i}", body="body", topic_id=1, created=datetime(2023, 1, i))
+            for i in range(1, 21)
+        )
+        db.session.commit()
+
+    auth.login()
+    response_text = client.get("/topics/1").text
+    assert "post 20" in response_text
+    assert "post 6" in response_text
+    assert "post 5" not in response_text
+    # no exact count or page numbers
+    assert "Showing entries" not in response_text
+    assert "Newer" not in response_text
+
+    older = re.search(r'href="([^"]+)">Older', response_text).group(1)
+    response_text = client.get(html.unescape(older)).text
+    assert "post 6" not in response_text
+    assert "post 5" in response_text
+    assert "test title" in response_text
+    assert "Older" not in response_text
+
+    newer = re.search(r'href="([^"]+)">Newer', response_text).group(1)
+    response_text = client.get(html.unescape(newer)).text
+    assert "post 20" in response_text
+    assert "Newer" not in response_text
+
+    assert client.get("/topics/1?after=malformed").status_code == 400
 
 
 def test_topic_required(app, client, auth):
@@ -108,7 +289,15 @@ def test_delete_topic(auth, client, app):
     assert response.headers["Location"] == "/topics"
 
     with app.app_context():
-        assert db.session.get(Topic, 1) is None
+        # flagged right away, purged later
+        assert db.session.get(Topic, 1).deleted_at is not None
+
+    # and hidden everywhere
+    assert "test topic" not in client.get("/topics").text
+    assert client.get("/topics/1").status_code == 404
+    assert client.get("/update_post/1").status_code == 404
+    assert client.get("/posts/1/body").status_code == 404
+    assert "test title" not in client.get("/search?q=test").text
 
 
 @pytest.mark.parametrize(
@@ -179,3 +368,29 @@ def test_delete_post(client, auth, app):
 
     with app.app_context():
         assert db.session.get(Post, 1) is None
+
+
+def test_post_excerpt(client, auth, app):
+    body = "\n\n".join(f"Paragraph {i}. " + "text " * 100 for i in range(5))
+    with app.app_context():
+        db.session.get(Post, 2).body = body
+        db.session.commit()
+
+    # public posts are listed with an excerpt, also to visitors
+    response_text = client.get("/").text
+    assert "Paragraph 0." in response_text
+    assert "Paragraph 2." not in response_text
+    assert 'href="/posts/2/body"' in response_text
+    response_text = client.get("/posts/2/body").text
+    assert "Paragraph 4." in response_text
+
+    # short posts are shown in full
+    auth.login()
+    assert 'href="/posts/1/body"' not in client.get("/topics/1").text
+
+
+def test_post_body_access(client, auth):
+    assert client.get("/posts/1/body").status_code == 403
+    assert client.get("/posts/3/body").status_code == 404
+    auth.login()
+    assert client.get("/posts/1/body").text == "<p>test\nbody</p>"
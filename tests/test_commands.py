@@ -0,0 +1,233 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from dailypush import commands, create_app, db, init_db
+from dailypush.models import User, Topic, Post
+
+
+@pytest.fixture
+def checkpoint(app, tmp_path):
+    """Keep rerender-posts progress out of the instance folder."""
+    path = tmp_path / "rerender-posts.json"
+    app.config["RERENDER_CHECKPOINT"] = str(path)
+    return path
+
+
+def clear_body_html(app):
+    """Simulate posts created before the body_html column existed."""
+    with app.app_context():
+        db.session.execute(db.update(Post).values(body_html=None))
+        db.session.commit()
+
+
+def get_body_html(app):
+    with app.app_context():
+        select = db.select(Post.id, Post.body_html).order_by(Post.id)
+        return dict(db.session.execute(select).all())
+
+
+@pytest.mark.parametrize("workers", ("0", "2"))
+def test_rerender_posts(app, runner, checkpoint, workers):
+    clear_body_html(app)
+    result = runner.invoke(args=["rerender-posts", "--workers", workers])
+    assert "Done, rendered 2 posts" in result.output
+    assert get_body_html(app) == {
+        1: "<p>test\nbody</p>",
+        2: "<p>public post body</p>",
+    }
+    # a completed run leaves no checkpoint behind
+    assert not checkpoint.exists()
+
+    # posts which already have HTML are skipped unless requested
+    result = runner.invoke(args=["rerender-posts", "--workers", workers])
+    assert "Done, rendered 0 posts" in result.output
+    result = runner.invoke(args=["rerender-posts", "--workers", workers, "--all"])
+    assert "Done, rendered 2 posts" in result.output
+
+
+def test_rerender_posts_invalidates_pages(app, client, runner, checkpoint):
+    with app.app_context():
+        db.session.execute(
+            db.update(Post).where(Post.id == 2).values(body_html="<p>stale</p>")
+        )
+        db.session.commit()
+        updated = db.session.get(Topic, 3).updated
+    for path in ("/", "/topics/3"):
+        assert "stale" in client.get(path).text
+        assert client.get(path).headers["X-Cache"] == "HIT"
+
+    runner.invoke(args=["rerender-posts", "--workers", "0", "--all"])
+    for path in ("/", "/topics/3"):
+        response = client.get(path)
+        assert response.headers["X-Cache"] == "MISS"
+        assert "public post body" in response.text
+    with app.app_context():
+        assert db.session.get(Topic, 3).updated > updated
+
+
+def test_rerender_posts_keeps_edits(app, runner, checkpoint, monkeypatch):
+    render = commands.render_body_and_excerpt
+
+    def edit_while_rendering(value, **budget):
+        if value == "test\nbody":
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        db.update(Post.__table__)
+                        .where(Post.id == 1)
+                        .values(body="**edited**", render_pending=True)
+                    )
+        return render(value, **budget)
+
+    monkeypatch.setattr(commands, "render_body_and_excerpt", edit_while_rendering)
+    clear_body_html(app)
+    runner.invoke(args=["rerender-posts", "--workers", "0"])
+    # the edit is left to the render queue, not overwritten with the old body
+    with app.app_context():
+        post = db.session.get(Post, 1)
+        assert post.body_html is None
+        assert post.render_pending
+    assert get_body_html(app)[2] == "<p>public post body</p>"
+
+
+def test_rerender_posts_resume(app, runner, checkpoint):
+    clear_body_html(app)
+    checkpoint.write_text(json.dumps({"last_id": 1, "all": False}))
+
+    result = runner.invoke(args=["rerender-posts", "--workers", "0", "--chunk-size", "1"])
+    assert "Resuming after post id 1." in result.output
+    assert "Done, rendered 1 posts" in result.output
+    assert get_body_html(app) == {1: None, 2: "<p>public post body</p>"}
+
+    checkpoint.write_text(json.dumps({"last_id": 1, "all": False}))
+    result = runner.invoke(args=["rerender-posts", "--workers", "0", "--restart"])
+    assert "Done, rendered 1 posts" in result.output
+    assert get_body_html(app)[1] == "<p>test\nbody</p>"
+
+
+def test_rerender_posts_resume_other_mode(app, runner, checkpoint):
+    clear_body_html(app)
+    # left by an interrupted run with --all
+    checkpoint.write_text(json.dumps({"last_id": 1, "all": True}))
+    result = runner.invoke(args=["rerender-posts", "--workers", "0"])
+    assert "Resuming" not in result.output
+    assert "Done, rendered 2 posts" in result.output
+
+    checkpoint.write_text(json.dumps({"last_id": 1, "all": False}))
+    result = runner.invoke(args=["rerender-posts", "--workers", "0", "--all"])
+    assert "Resuming" not in result.output
+    assert "Done, rendered 2 posts" in result.output
+
+
+def test_rerender_posts_file_database(tmp_path):
+    # reads and writes must not lock each other out of an SQLite file
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'dailypush.sqlite'}",
+            "RERENDER_CHECKPOINT": str(tmp_path / "rerender-posts.json"),
+        }
+    )
+    with app.app_context():
+        init_db()
+        topic = Topic(name="topic", author=User(username="user", hash="x"))
+        db.session.add_all(
+            Post(title=f"post {i}", body=f"*body {i}*", topic=topic) for i in range(5)
+        )
+        db.session.commit()
+    clear_body_html(app)
+
+    result = app.test_cli_runner().invoke(
+        args=["rerender-posts", "--workers", "0", "--chunk-size", "2"]
+    )
+    assert result.exception is None
+    assert "Done, rendered 5 posts" in result.output
+    assert get_body_html(app)[5] == "<p><em>body 4</em></p>"
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_recount_topics(app, runner):
+    with app.app_context():
+        db.session.execute(
+            db.update(Topic).values(post_count=5, last_post_at=datetime(2000, 1, 1))
+        )
+        db.session.commit()
+
+    result = runner.invoke(args=["recount-topics", "--batch-size", "2"])
+    assert "Recounted 3 topics." in result.output
+    with app.app_context():
+        select = db.select(Topic.id, Topic.post_count, Topic.last_post_at)
+        assert db.session.execute(select.order_by(Topic.id)).all() == [
+            (1, 1, datetime(2022, 1, 2)),
+            (2, 0, datetime(2022, 1, 2)),
+            (3, 1, datetime(2022, 1, 3)),
+        ]
+
+
+def get_rows(app):
+    with app.app_context():
+        return {
+            model.__tablename__: [
+                dict(row._mapping)
+                for row in db.session.execute(
+                    db.select(model.__table__).order_by(model.id)
+                )
+            ]
+            for model in (User, Topic, Post)
+        }
+
+
+def clear_tables(app):
+    with app.app_context():
+        for model in (Post, Topic, User):
+            db.session.execute(db.delete(model.__table__))
+        db.session.commit()
+
+
+def test_export_import(app, runner, tmp_path):
+    with app.app_context():
+        # HTML which doesn't match the body, to tell whether it was rendered again
+        db.session.execute(
+            db.update(Post).where(Post.id == 1).values(body_html="<p>exported</p>")
+        )
+        db.session.execute(db.update(Post).where(Post.id == 2).values(body_html=None))
+        db.session.commit()
+    rows = get_rows(app)
+
+    dump = tmp_path / "dump.jsonl"
+    result = runner.invoke(args=["export", str(dump)])
+    assert "Exported 8 rows" in result.output
+    lines = [json.loads(line) for line in dump.read_text().splitlines()]
+    assert [line["table"] for line in lines] == ["users"] * 3 + ["topics"] * 3 + [
+        "posts"
+    ] * 2
+    assert lines[-1]["row"]["created"] == "2022-01-03T00:00:00"
+
+    clear_tables(app)
+    result = runner.invoke(args=["import", str(dump), "--batch-size", "2"])
+    assert "Done, imported 8 rows" in result.output
+    imported = get_rows(app)
+    # ids and HTML are kept, and only the post without HTML is rendered
+    assert imported["posts"][0]["body_html"] == "<p>exported</p>"
+    assert imported["posts"][1]["body_html"] == "<p>public post body</p>"
+    imported["posts"][1]["body_html"] = None
+    assert imported == rows
+
+    clear_tables(app)
+    runner.invoke(args=["import", str(dump), "--render", "all"])
+    assert get_rows(app)["posts"][0]["body_html"] == "<p>test\nbody</p>"
+
+    clear_tables(app)
+    runner.invoke(args=["import", str(dump), "--render", "none"])
+    assert get_rows(app)["posts"][1]["body_html"] is None
+
+
+def test_import_unknown_table(app, runner, tmp_path):
+    dump = tmp_path / "dump.jsonl"
+    dump.write_text('{"table": "secrets", "row": {}}\n')
+    result = runner.invoke(args=["import", str(dump)])
+    assert result.exit_code != 0
+    assert "Unknown table 'secrets'." in result.output
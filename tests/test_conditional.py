@@ -0,0 +1,119 @@
+from datetime import datetime
+
+import pytest
+
+from dailypush import db
+from dailypush.instrumentation import collect_queries
+from dailypush.models import User, Topic, Post
+from dailypush.purge import purge_deleted
+from dailypush.render_queue import render_pending_posts
+
+
+def revalidate(client, path, etag):
+    return client.get(path, headers={"If-None-Match": etag})
+
+
+@pytest.mark.parametrize("path", ("/", "/topics", "/topics/1"))
+def test_not_modified(client, auth, path):
+    auth.login()
+    response = client.get(path)
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert response.cache_control.no_cache
+
+    with collect_queries() as stats:
+        response = revalidate(client, path, etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.data == b""
+    # only the validator, no posts
+    assert len(stats.statements) == 1
+    assert "posts" not in stats.statements[0]
+
+
+def test_validator_follows_changes(app, client, auth):
+    auth.login()
+    etags = {path: client.get(path).headers["ETag"] for path in ("/topics/1", "/")}
+
+    with app.app_context():
+        db.session.add(Post(title="fresh post", body="body", topic_id=3))
+        db.session.commit()
+    # other topics haven't changed
+    assert revalidate(client, "/topics/1", etags["/topics/1"]).status_code == 304
+    response = revalidate(client, "/", etags["/"])
+    assert response.status_code == 200
+    assert "fresh post" in response.text
+
+    changes = (
+        lambda: setattr(db.session.get(Post, 1), "title", "edited"),
+        lambda: setattr(db.session.get(User, 1), "username", "renamed"),
+        lambda: db.session.delete(db.session.get(Post, 1)),
+    )
+    for change in changes:
+        etag = client.get("/topics/1").headers["ETag"]
+        with app.app_context():
+            change()
+            db.session.commit()
+        assert revalidate(client, "/topics/1", etag).status_code == 200
+
+
+def test_validator_after_purge(app, client, auth):
+    with app.app_context():
+        for id in (1, 2, 3):
+            db.session.execute(
+                db.update(Topic)
+                .where(Topic.id == id)
+                .values(updated=datetime(2022, 1, id))
+            )
+        db.session.commit()
+    auth.login()
+    etag = client.get("/topics").headers["ETag"]
+
+    with app.app_context():
+        db.session.get(Topic, 1).soft_delete()
+        db.session.commit()
+        while purge_deleted():
+            pass
+    # the remaining topics changed before the purged one
+    response = revalidate(client, "/topics", etag)
+    assert response.status_code == 200
+    assert "test topic" not in response.text
+
+
+def test_bulk_render_changes_validator(app, client, auth):
+    app.config["RENDER_MODE"] = "worker"
+    auth.login()
+    client.post("/create_post/1", data={"title": "pending", "body": "**bold**"})
+    etag = client.get("/topics/1").headers["ETag"]
+
+    with app.app_context():
+        render_pending_posts()
+    response = revalidate(client, "/topics/1", etag)
+    assert response.status_code == 200
+    assert "<strong>bold</strong>" in response.text
+
+
+def test_validator_per_page_and_viewer(client, auth):
+    etag = client.get("/topics/3").headers["ETag"]
+    assert client.get("/topics/3?page=1").headers["ETag"] != etag
+    assert revalidate(client, "/topics/3", etag).status_code == 304
+
+    # the page shows who's logged in
+    auth.login()
+    response = revalidate(client, "/topics/3", etag)
+    assert response.status_code == 200
+    assert "Log Out" in response.text
+
+    # topics the viewer can't see are never validated
+    auth.logout()
+    auth.login("other", "validUser#2")
+    response = client.get("/topics/1")
+    assert response.status_code == 403
+    assert "ETag" not in response.headers
+
+
+def test_cached_page_not_modified(client):
+    etag = client.get("/topics/3").headers["ETag"]
+    response = revalidate(client, "/topics/3", etag)
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.status_code == 304
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+from dailypush import db
+from dailypush.feed import RecentPostsFeed, get_feed
+from dailypush.instrumentation import collect_queries
+from dailypush.models import Topic, Post
+
+
+def count_selects(path, client):
+    with collect_queries() as stats:
+        response = client.get(path)
+    assert response.status_code == 200
+    return stats.count, response.text
+
+
+def feed_titles(app):
+    with app.app_context():
+        return [post.title for post in get_feed().posts()]
+
+
+def test_home_page_from_memory(app, client):
+    count, response_text = count_selects("/", client)
+    # the page's validator and the feed
+    assert count == 2
+    assert "public post title" in response_text
+    # private posts are never in the feed
+    assert "test title" not in response_text
+
+    count, response_text = count_selects("/", client)
+    assert count == 0
+    assert "public post title" in response_text
+
+
+def test_new_post(app, client, auth):
+    feed_titles(app)
+    auth.login()
+    client.post("/create_post/3", data={"title": "newest", "body": "new"})
+    # added without a rebuild
+    with app.app_context():
+        assert get_feed()._is_fresh()
+    assert feed_titles(app) == ["newest", "public post title"]
+
+    # posts in private topics don't affect the feed
+    client.post("/create_post/1", data={"title": "private", "body": "private"})
+    with app.app_context():
+        assert get_feed()._is_fresh()
+    assert feed_titles(app) == ["newest", "public post title"]
+
+
+def test_size(app, monkeypatch):
+    monkeypatch.setattr("dailypush.constants.RECENT_POSTS", 3)
+    with app.app_context():
+        db.session.add_all(
+            Post(title=f"post {i}", body="body", topic_id=3, created=datetime(2023, 1, i))
+            for i in range(1, 6)
+        )
+        db.session.commit()
+    assert feed_titles(app) == ["post 5", "post 4", "post 3"]
+
+    with app.app_context():
+        # an older post doesn't make it into a full feed
+        db.session.add(Post(title="old", body="old", topic_id=3, created=datetime(2020, 1, 1)))
+        db.session.commit()
+    assert feed_titles(app) == ["post 5", "post 4", "post 3"]
+
+
+def test_topic_made_private(app, client, auth):
+    assert feed_titles(app) == ["public post title"]
+    auth.login()
+    client.post("/update_topic/3", data={"name": "public topic", "is_public": ""})
+    with app.app_context():
+        # evicted before anything reloads the feed
+        assert get_feed()._posts == []
+    assert feed_titles(app) == []
+    assert "public post title" not in client.get("/").text
+
+
+def test_post_changed(app):
+    assert feed_titles(app) == ["public post title"]
+    with app.app_context():
+        db.session.get(Post, 2).title = "edited"
+        db.session.commit()
+    assert feed_titles(app) == ["edited"]
+
+    with app.app_context():
+        db.session.delete(db.session.get(Post, 2))
+        db.session.commit()
+    assert feed_titles(app) == []
+
+
+def test_rollback(app):
+    feed_titles(app)
+    with app.app_context():
+        db.session.get(Topic, 3).is_public = False
+        db.session.flush()
+        db.session.rollback()
+        assert get_feed()._is_fresh()
+    assert feed_titles(app) == ["public post title"]
+
+
+def test_ttl(app):
+    app.config["RECENT_POSTS_TTL"] = 0
+    feed_titles(app)
+    with app.app_context():
+        # changes made bypassing the session
+        db.session.execute(db.update(Post).values(title="bulk"))
+        db.session.commit()
+    assert feed_titles(app) == ["bulk"]
+
+
+def test_change_while_rebuilding(app):
+    feed = RecentPostsFeed(5)
+    load = feed._load
+
+    def load_and_change():
+        posts = load()
+        feed.evict(topic_ids={3})
+        return posts
+
+    feed._load = load_and_change
+    with app.app_context():
+        assert [post.title for post in feed.posts()] == ["public post title"]
+        # the outdated result isn't kept
+        assert not feed._is_fresh()
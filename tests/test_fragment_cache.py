@@ -0,0 +1,85 @@
+from dailypush import db
+from dailypush.fragment_cache import get_fragment_cache
+from dailypush.models import Topic, Post
+from dailypush.render_queue import render_pending_posts
+
+
+def fragment_stats(app):
+    with app.app_context():
+        return get_fragment_cache().stats()
+
+
+def test_posts_cached(app, client, auth):
+    auth.login()
+    first = client.get("/topics/3").text
+    stats = fragment_stats(app)
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+    assert client.get("/topics/3").text == first
+    assert fragment_stats(app)["hits"] == 2
+
+
+def test_edit_button_per_viewer(client, auth):
+    auth.login()
+    assert "post-edit-link" in client.get("/topics/3").text
+    assert "post-edit-link" in client.get("/").text
+
+    auth.logout()
+    response = client.get("/topics/3")
+    assert "public post body" in response.text
+    assert "post-edit-link" not in response.text
+
+    auth.login("other", "validUser#2")
+    response = client.get("/")
+    assert "By test in" in response.text
+    assert "post-edit-link" not in response.text
+
+
+def test_changed_posts_rendered_again(app, client, auth):
+    auth.login()
+    client.get("/topics/3")
+    client.post("/update_post/2", data={"title": "edited", "body": "new body"})
+    response = client.get("/topics/3")
+    assert "edited" in response.text
+    assert "new body" in response.text
+
+    # bulk renders change the version too
+    app.config["RENDER_MODE"] = "worker"
+    client.post("/update_post/2", data={"title": "edited", "body": "**bold**"})
+    assert "being prepared" in client.get("/topics/3").text
+    with app.app_context():
+        render_pending_posts()
+    assert "<strong>bold</strong>" in client.get("/topics/3").text
+
+
+def test_renamed_topic_on_home_page(app, client, auth):
+    auth.login("other", "validUser#2")
+    assert "public topic" in client.get("/").text
+    with app.app_context():
+        db.session.get(Topic, 3).name = "renamed topic"
+        db.session.commit()
+    assert "renamed topic" in client.get("/").text
+
+
+def test_cache_bounded(app, client, auth):
+    app.config["FRAGMENT_CACHE_SIZE"] = 3
+    with app.app_context():
+        db.session.add_all(
+            Post(title=f"post {i}", body="body", topic_id=3) for i in range(3)
+        )
+        db.session.commit()
+    auth.login()
+    response = client.get("/topics/3")
+    assert response.text.count('class="card mb-3 post"') == 4
+    stats = fragment_stats(app)
+    assert stats["size"] == 3
+    assert stats["evictions"] == 5
+
+
+def test_admin_fragment_cache_stats(client, auth):
+    auth.login("john", "validUser#3")
+    client.get("/")
+    response = client.get("/admin/")
+    assert "Fragment cache" in response.text
+    assert "2 misses" in response.text
@@ -0,0 +1,78 @@
+import logging
+
+import pytest
+
+from dailypush import db
+from dailypush.instrumentation import collect_queries, fingerprint, init_app
+from dailypush.models import Post
+
+
+def test_fingerprint():
+    assert fingerprint("SELECT * FROM posts\n WHERE id = 5 AND title = 'it''s'") == (
+        "SELECT * FROM posts WHERE id = ? AND title = ?"
+    )
+    assert fingerprint("SELECT * FROM posts WHERE id IN (?, ?, ?)") == fingerprint(
+        "SELECT * FROM posts WHERE id IN (?)"
+    )
+
+
+def test_collect_queries(app):
+    with app.app_context():
+        with collect_queries() as stats:
+            for id in (1, 2):
+                db.session.get(Post, id)
+        assert stats.count == 2
+        assert stats.duration > 0
+        assert len(stats.fingerprints) == 1
+        assert stats.repeated(2)[0][1] == 2
+        assert stats.repeated(3) == []
+        assert all("FROM posts" in statement for statement in stats.statements)
+        assert [parameters[0] for parameters in stats.parameters] == [1, 2]
+
+        # nothing is recorded outside the block
+        db.session.expire_all()
+        db.session.get(Post, 1)
+        assert stats.count == 2
+
+
+def test_collect_failed_queries(app):
+    with app.app_context():
+        with collect_queries() as stats:
+            with pytest.raises(db.exc.IntegrityError):
+                db.session.execute(
+                    db.insert(Post.__table__).values(id=1, title="dup", body="b")
+                )
+            db.session.rollback()
+            db.session.get(Post, 2)
+    # the failed INSERT is timed on its own, not from the next statement
+    assert [statement.split()[0] for statement in stats.statements] == [
+        "INSERT",
+        "SELECT",
+    ]
+    assert stats.count == 2
+
+
+def test_disabled(client):
+    assert "Server-Timing" not in client.get("/").headers
+
+
+def test_request_stats(app, client, caplog):
+    app.config["SQL_INSTRUMENTATION"] = True
+    app.config["SQL_REPEATED_QUERY_THRESHOLD"] = 2
+    # the app fixture was created with instrumentation disabled
+    init_app(app)
+
+    @app.route("/n-plus-one")
+    def n_plus_one():
+        return ",".join(db.session.get(Post, id).title for id in (1, 2))
+
+    with caplog.at_level(logging.INFO, logger="dailypush.instrumentation"):
+        response = client.get("/n-plus-one")
+
+    assert response.headers["Server-Timing"].startswith("sql;dur=")
+    assert response.headers["Server-Timing"].endswith('desc="2 queries"')
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(
+        "endpoint=n_plus_one status=200 queries=2" in message for message in messages
+    )
+    assert any("possible N+1 endpoint=n_plus_one count=2" in m for m in messages)
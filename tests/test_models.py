@@ -1,4 +1,10 @@
+import re
+from datetime import datetime
+
+import pytest
+
 from dailypush import db
+from dailypush.instrumentation import collect_queries
 from dailypush.models import User, Topic, Post
 
 
@@ -22,3 +28,103 @@ def test_post(app):
         post = db.session.get(Post, 1)
         assert str(post) == "test title"
         assert repr(post) == "<Post: 'test title'>"
+
+
+def get_topic_stats(app):
+    with app.app_context():
+        select = db.select(Topic.id, Topic.post_count, Topic.last_post_at)
+        return {id: (count, last) for id, count, last in db.session.execute(select)}
+
+
+def test_topic_stats(app):
+    assert get_topic_stats(app) == {
+        1: (1, datetime(2022, 1, 2)),
+        # no posts yet, so the latest activity is topic creation
+        2: (0, datetime(2022, 1, 2)),
+        3: (1, datetime(2022, 1, 3)),
+    }
+
+    with app.app_context():
+        db.session.add(Post(title="new", body="new", topic_id=2, created=datetime(2023, 1, 1)))
+        # an older post doesn't move latest activity back
+        db.session.add(Post(title="old", body="old", topic_id=1, created=datetime(2021, 1, 1)))
+        db.session.commit()
+    assert get_topic_stats(app)[1] == (2, datetime(2022, 1, 2))
+    assert get_topic_stats(app)[2] == (1, datetime(2023, 1, 1))
+
+    # move a post to another topic
+    with app.app_context():
+        db.session.get(Post, 1).topic_id = 3
+        db.session.commit()
+    assert get_topic_stats(app)[1] == (1, datetime(2021, 1, 1))
+    assert get_topic_stats(app)[3] == (2, datetime(2022, 1, 3))
+
+    with app.app_context():
+        db.session.delete(db.session.get(Post, 2))
+        db.session.commit()
+    assert get_topic_stats(app)[3] == (1, datetime(2022, 1, 2))
+
+
+@pytest.mark.parametrize(
+    ("path", "login"),
+    (
+        ("/", False),
+        ("/topics?filter=public", False),
+        ("/topics?filter=personal", True),
+        ("/topics?filter=public&sort=activity", False),
+        ("/topics?filter=personal&sort=activity", True),
+        ("/topics?filter=public&sort=name", False),
+        ("/topics?filter=personal&sort=name&q=topic", True),
+        ("/topics/1", True),
+    ),
+)
+def test_query_plans(app, client, auth, path, login):
+    """Queries of the most visited pages must use indexes, not table scans."""
+    app.config["TOPIC_PAGINATION"] = "count"
+    if login:
+        auth.login()
+
+    with collect_queries() as stats:
+        assert client.get(path).status_code == 200
+    statements = [
+        (statement, parameters)
+        for statement, parameters in zip(stats.statements, stats.parameters)
+        if statement.lstrip().upper().startswith("SELECT")
+    ]
+
+    with app.app_context():
+        assert statements
+        with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters
+                ).all()
+                details = [row[-1] for row in plan]
+                # "SCAN table" without "USING INDEX" reads the whole table
+                table_scans = [
+                    detail
+                    for detail in details
+                    if re.match(r"SCAN (posts|topics)\b(?!.* USING .*INDEX)", detail)
+                ]
+                assert not table_scans, (statement, details)
+
+
+def test_keyset_query_plan(app):
+    with app.app_context():
+        cursor = (datetime(2022, 1, 2), 1)
+        select = (
+            db.select(Post)
+            .filter_by(topic_id=1)
+            .where(db.tuple_(Post.created, Post.id) < db.tuple_(*cursor))
+            .order_by(Post.created.desc(), Post.id.desc())
+            .limit(16)
+        )
+        compiled = select.compile(db.engine)
+        with db.engine.connect() as conn:
+            plan = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + str(compiled),
+                tuple(compiled.params[name] for name in compiled.positiontup),
+            ).all()
+        details = " | ".join(row[-1] for row in plan)
+        assert "ix_posts_topic_id_created_id" in details
+        assert "TEMP B-TREE" not in details
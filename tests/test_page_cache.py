@@ -0,0 +1,137 @@
+import pytest
+
+from dailypush import db
+from dailypush.models import User, Topic, Post
+from dailypush.page_cache import FileSystemPageCache
+from dailypush.render_queue import render_pending_posts
+
+
+def cache_status(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return response.headers.get("X-Cache")
+
+
+def test_anonymous_pages_cached(client, auth):
+    assert cache_status(client, "/") == "MISS"
+    response = client.get("/")
+    assert response.headers["X-Cache"] == "HIT"
+    assert "public post title" in response.text
+
+    # the query string is part of the key
+    assert cache_status(client, "/topics?filter=public") == "MISS"
+    assert cache_status(client, "/topics?filter=public") == "HIT"
+    assert cache_status(client, "/topics?filter=public&sort=name") == "MISS"
+
+    # logged in users always get fresh pages
+    auth.login()
+    assert cache_status(client, "/") is None
+    assert "Log Out" in client.get("/").text
+
+
+def test_public_topic_for_visitors(client):
+    response = client.get("/topics/3")
+    assert "public post title" in response.text
+    assert "New entry" not in response.text
+    assert cache_status(client, "/topics/3") == "HIT"
+
+    # private topics ask to log in
+    response = client.get("/topics/1")
+    assert response.headers["Location"] == "/auth/login"
+    assert "X-Cache" not in response.headers
+
+
+def test_invalidation_by_topic(app, client):
+    with app.app_context():
+        db.session.add(Topic(id=4, name="another", author_id=2, is_public=True))
+        db.session.commit()
+    for path in ("/", "/topics", "/topics/3", "/topics/4"):
+        assert cache_status(client, path) == "MISS"
+
+    with app.app_context():
+        db.session.add(Post(title="fresh post", body="body", topic_id=3))
+        db.session.commit()
+
+    # only pages which may show the post are rendered again
+    assert cache_status(client, "/topics/4") == "HIT"
+    for path in ("/", "/topics", "/topics/3"):
+        assert cache_status(client, path) == "MISS"
+    assert "fresh post" in client.get("/topics/3").text
+
+    with app.app_context():
+        db.session.get(User, 2).username = "renamed"
+        db.session.commit()
+    assert cache_status(client, "/topics/4") == "MISS"
+
+
+def test_bulk_render_invalidates(app, client):
+    app.config["RENDER_MODE"] = "worker"
+    with app.app_context():
+        db.session.add(Post(title="pending post", body="**bold**", topic_id=3))
+        db.session.commit()
+    assert "being prepared" in client.get("/topics/3").text
+    assert cache_status(client, "/topics/3") == "HIT"
+
+    with app.app_context():
+        render_pending_posts()
+    response = client.get("/topics/3")
+    assert response.headers["X-Cache"] == "MISS"
+    assert "<strong>bold</strong>" in response.text
+
+
+def test_flashed_messages_not_cached(client, auth):
+    client.get("/")
+    auth.login()
+    client.post("/delete_post/2")
+    auth.logout()
+    with client.session_transaction() as session:
+        session["_flashes"] = [("message", "Post deleted!")]
+    response = client.get("/")
+    assert "X-Cache" not in response.headers
+    assert "Post deleted!" in response.text
+
+
+@pytest.mark.parametrize("backend", ("memory", "filesystem", None))
+def test_backends(app, client, tmp_path, backend):
+    app.config["PAGE_CACHE"] = backend
+    app.config["PAGE_CACHE_DIR"] = str(tmp_path)
+    app.extensions.pop("page_cache", None)
+    client.get("/topics/3")
+    if backend is None:
+        assert cache_status(client, "/topics/3") is None
+        return
+    assert cache_status(client, "/topics/3") == "HIT"
+    with app.app_context():
+        db.session.get(Topic, 3).name = "renamed topic"
+        db.session.commit()
+    assert cache_status(client, "/topics/3") == "MISS"
+
+    if backend == "filesystem":
+        assert any(tmp_path.glob("*.page"))
+        # shared by other processes, e.g. after a restart
+        app.extensions.pop("page_cache")
+        assert cache_status(client, "/topics/3") == "HIT"
+
+
+def test_filesystem_cache_bounded(tmp_path):
+    cache = FileSystemPageCache(str(tmp_path), maxsize=2)
+    for i in range(4):
+        cache.set(("page", i), b"body")
+    # the latest page is always kept
+    assert cache.get(("page", 3)) == b"body"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 0,
+        "evictions": 2,
+        "size": 2,
+        "maxsize": 2,
+    }
+
+
+def test_admin_page_cache_stats(client, auth):
+    client.get("/")
+    client.get("/")
+    auth.login("john", "validUser#3")
+    response = client.get("/admin/")
+    assert "Page cache" in response.text
+    assert "1 hits" in response.text
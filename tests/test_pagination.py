@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+from dailypush import db
+from dailypush.models import Post
+from dailypush.pagination import KeysetPagination, decode_cursor, encode_cursor
+
+
+def test_cursor():
+    created = datetime(2022, 1, 2, 3, 4, 5)
+    token = encode_cursor(created, 7)
+    assert decode_cursor(token, datetime, int) == (created, 7)
+    assert decode_cursor(encode_cursor("name", 1), str, int) == ("name", 1)
+
+
+@pytest.mark.parametrize("token", ("", "!!", encode_cursor(1), encode_cursor([], 1)))
+def test_cursor_malformed(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, datetime, int)
+
+
+def test_keyset_pagination(app):
+    with app.app_context():
+        db.session.add_all(
+            Post(body=str(i), topic_id=1, created=datetime(2023, 1, 1 + i // 2))
+            for i in range(5)
+        )
+        db.session.commit()
+
+        def get_page(**kwargs):
+            select = db.select(Post).filter_by(topic_id=1)
+            return KeysetPagination(select, (Post.created, Post.id), 2, desc=True, **kwargs)
+
+        first = get_page()
+        # posts created on the same day are ordered by id
+        assert [post.body for post in first] == ["4", "3"]
+        assert not first.has_prev and first.has_next
+        assert first.prev_cursor is None
+
+        second = get_page(after=decode_cursor(first.next_cursor, datetime, int))
+        assert [post.body for post in second] == ["2", "1"]
+        assert second.has_prev and second.has_next
+
+        last = get_page(after=decode_cursor(second.next_cursor, datetime, int))
+        assert [post.body for post in last] == ["0", "test\nbody"]
+        assert last.has_prev and not last.has_next
+
+        back = get_page(before=decode_cursor(last.prev_cursor, datetime, int))
+        assert [post.body for post in back] == ["2", "1"]
+        assert back.has_prev and back.has_next
+
+        back = get_page(before=decode_cursor(back.prev_cursor, datetime, int))
+        assert [post.body for post in back] == ["4", "3"]
+        assert not back.has_prev and back.has_next
+
+        # selecting columns gives rows
+        select = db.select(Post.id, Post.created).filter_by(topic_id=1)
+        page = KeysetPagination(select, (Post.created, Post.id), 2)
+        assert page.items[0].id == 1
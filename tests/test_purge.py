@@ -0,0 +1,71 @@
+from dailypush import db
+from dailypush.models import User, Topic, Post
+from dailypush.purge import pending_deletions, purge_deleted
+
+
+def test_soft_delete_user(app, client, auth):
+    with app.app_context():
+        db.session.get(User, 1).soft_delete()
+        db.session.commit()
+        assert db.session.get(Topic, 3).deleted_at is not None
+        assert db.session.get(Topic, 2).deleted_at is None
+
+    # the user's public posts are gone, and the user can't log in
+    assert "public post title" not in client.get("/").text
+    assert "Invalid username" in auth.login().text
+
+
+def test_purge_deleted(app, runner):
+    with app.app_context():
+        topic = db.session.get(Topic, 1)
+        db.session.add_all(
+            Post(title=f"post {i}", body="body", topic=topic) for i in range(4)
+        )
+        db.session.commit()
+        db.session.get(User, 1).soft_delete()
+        db.session.commit()
+        assert pending_deletions() == {"users": 1, "topics": 2, "posts": 6}
+
+        # posts first, a batch at a time
+        assert purge_deleted(4) == 4
+        assert pending_deletions() == {"users": 1, "topics": 2, "posts": 2}
+        assert purge_deleted(4) == 2
+        # then topics, and users
+        assert purge_deleted(4) == 2
+        assert purge_deleted(4) == 1
+        assert purge_deleted(4) == 0
+        assert pending_deletions() == {"users": 0, "topics": 0, "posts": 0}
+
+        assert db.session.get(User, 1) is None
+        assert db.session.get(User, 2) is not None
+        assert db.session.execute(db.select(db.func.count(Post.id))).scalar() == 0
+        # the search index too
+        assert db.session.execute(db.text("SELECT rowid FROM posts_fts")).all() == []
+
+    result = runner.invoke(args=["purge-deleted"])
+    assert "Done, purged 0 rows." in result.output
+
+
+def test_purge_deleted_command(app, runner):
+    with app.app_context():
+        db.session.get(Topic, 2).soft_delete()
+        db.session.commit()
+
+    result = runner.invoke(args=["purge-deleted", "--batch-size", "1"])
+    assert "Done, purged 1 rows." in result.output
+    with app.app_context():
+        assert db.session.get(Topic, 2) is None
+
+
+def test_admin_soft_delete(app, client, auth):
+    auth.login("john", "validUser#3")
+    client.post("/admin/topic/delete/", data={"id": "2"})
+    client.post("/admin/user/delete/", data={"id": "1"})
+
+    with app.app_context():
+        assert db.session.get(Topic, 2).deleted_at is not None
+        assert db.session.get(User, 1).deleted_at is not None
+
+    response = client.get("/admin/")
+    assert "Pending deletions" in response.text
+    assert "1 users &middot; 3 topics &middot;\n    2 posts" in response.text
@@ -0,0 +1,71 @@
+from dailypush import db
+from dailypush.models import Post
+from dailypush.render_queue import render_pending_posts
+
+
+def test_worker_mode(app, client, auth, runner):
+    app.config["RENDER_MODE"] = "worker"
+    auth.login()
+    client.post("/update_post/1", data={"title": "queued", "body": "*queued*"})
+    with app.app_context():
+        post = db.session.get(Post, 1)
+        assert post.render_pending
+        assert post.body_html is None
+
+    assert "being prepared" in client.get("/topics/1").text
+
+    result = runner.invoke(args=["render-worker", "--once"])
+    assert "Rendered 1 posts." in result.output
+    with app.app_context():
+        post = db.session.get(Post, 1)
+        assert not post.render_pending
+        assert post.body_html == "<p><em>queued</em></p>"
+
+    assert "<em>queued</em>" in client.get("/topics/1").text
+
+
+def test_thread_mode(app, client, auth):
+    app.config["RENDER_MODE"] = "thread"
+    # render synchronously after commit, instead of in a pool
+    app.config["RENDER_THREADS"] = 0
+    auth.login()
+    client.post("/create_post/1", data={"title": "", "body": "*threaded*"})
+    with app.app_context():
+        select = db.select(Post).filter_by(body="*threaded*")
+        post = db.session.execute(select).scalar()
+        assert not post.render_pending
+        assert post.body_html == "<p><em>threaded</em></p>"
+
+
+def test_rollback(app):
+    app.config["RENDER_MODE"] = "thread"
+    with app.app_context():
+        db.session.get(Post, 1).body = "rolled back"
+        db.session.flush()
+        assert db.session.info["render_pending"]
+        db.session.rollback()
+        assert "render_pending" not in db.session.info
+
+
+def test_body_changed_while_rendering(app, monkeypatch):
+    app.config["RENDER_MODE"] = "worker"
+
+    def render_and_edit(value):
+        # simulate the author saving a new body in the meantime
+        db.session.execute(db.update(Post).filter_by(id=1).values(body="newer"))
+        return value
+
+    with app.app_context():
+        db.session.get(Post, 1).body = "older"
+        db.session.commit()
+        monkeypatch.setattr(
+            "dailypush.render_queue.cached_render_body", render_and_edit
+        )
+        assert render_pending_posts() == 1
+        monkeypatch.undo()
+
+        post = db.session.get(Post, 1)
+        assert post.render_pending
+        assert render_pending_posts() == 1
+        assert render_pending_posts() == 0
+        assert db.session.get(Post, 1).body_html == "<p>newer</p>"
@@ -0,0 +1,177 @@
+import os
+import re
+import threading
+import time
+
+from dailypush import db, constants, rendering
+from dailypush.models import Post
+
+
+def test_render_body():
+    body = "# Heading\n\nSee https://example.com\n\n<script>alert(1)</script>"
+    assert rendering.render_body(body) == (
+        "<h5>Heading</h5>\n"
+        '<p>See <a href="https://example.com" rel="nofollow">https://example.com</a></p>\n'
+        "alert(1)"
+    )
+
+
+def test_render_body_reset():
+    # reference links of one post must not leak into the next one
+    rendering.render_body("[link][ref]\n\n[ref]: https://example.com")
+    assert "href" not in rendering.render_body("[link][ref]")
+
+
+def test_pipeline_per_thread():
+    pipelines = []
+
+    def collect():
+        pipelines.append(rendering._get_pipeline())
+
+    collect()
+    collect()
+    thread = threading.Thread(target=collect)
+    thread.start()
+    thread.join()
+    assert pipelines[0] is pipelines[1]
+    assert pipelines[0] is not pipelines[2]
+
+
+def test_allowed_tags_match_js_sanitizer():
+    path = os.path.join(
+        os.path.dirname(rendering.__file__), "static", "pagedown_sanitizer.js"
+    )
+    with open(path) as f:
+        source = f.read()
+    whitelist = re.search(r"var basic_tag_whitelist = (.*);", source).group(1)
+    js_tags = {"a"}  # allowed by a separate regex, a_white
+    for group in re.findall(r"\(((?:\w+\|)+\w+)\)", whitelist):
+        js_tags.update(group.split("|"))
+    assert js_tags == constants.ALLOWED_TAGS
+
+
+def test_benchmark():
+    result = rendering.benchmark(["*a*", "**b**"], rounds=2)
+    assert result["posts"] == 4
+    assert result["posts_per_sec"] > 0
+    assert result["p99_ms"] >= result["p50_ms"]
+
+
+def test_render_cache(app, monkeypatch):
+    calls = []
+    render_body = rendering.render_body
+
+    def counting_render_body(value):
+        calls.append(value)
+        return render_body(value)
+
+    monkeypatch.setattr("dailypush.rendering.render_body", counting_render_body)
+    rendering.render_cache.clear()
+    with app.app_context():
+        post = db.session.get(Post, 1)
+        # saving an unchanged body doesn't render it again
+        post.body = post.body
+        assert calls == []
+
+        post.body = "*cached*"
+        db.session.get(Post, 2).body = "*cached*"
+        assert calls == ["*cached*"]
+        assert db.session.get(Post, 2).body_html == "<p><em>cached</em></p>"
+
+    stats = rendering.render_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_render_size_limit(app, caplog):
+    app.config["RENDER_MAX_BODY_SIZE"] = 10
+    rendering.render_cache.clear()
+    with app.app_context():
+        post = db.session.get(Post, 1)
+        post.body = "# <b>Too long</b>\nfor Markdown"
+        assert post.body_html == (
+            "<p># &lt;b&gt;Too long&lt;/b&gt;<br>\nfor Markdown</p>"
+        )
+    assert "exceeds the render size limit" in caplog.text
+
+
+def test_render_timeout(caplog):
+    # long runs of backticks take Python-Markdown seconds to convert
+    body = "`" * 2000
+    try:
+        assert rendering.render_within_budget(body, timeout=0.2) == f"<p>{body}</p>"
+        assert "took over 0.2s" in caplog.text
+        # the stuck worker is replaced
+        assert rendering.render_within_budget("*a*", timeout=5) == "<p><em>a</em></p>"
+    finally:
+        rendering.render_pool.terminate()
+
+
+def test_render_workers_not_forked(monkeypatch):
+    # state of the app process, e.g. locks held by its other threads, isn't copied
+    #   into the workers
+    lock = threading.Lock()
+    get_pipeline = rendering._get_pipeline
+
+    def locked_pipeline():
+        with lock:
+            return get_pipeline()
+
+    monkeypatch.setattr(rendering, "_get_pipeline", locked_pipeline)
+    rendering.render_pool.terminate()
+    try:
+        with lock:
+            assert rendering.render_pool.render("# a", 5) == "<h5>a</h5>"
+    finally:
+        rendering.render_pool.terminate()
+
+
+def test_render_timeout_isolated(monkeypatch):
+    monkeypatch.setattr(rendering.render_pool, "processes", 2)
+    slow = "`" * 2000
+    results = {}
+
+    def render_slow():
+        results["slow"] = rendering.render_within_budget(slow, timeout=0.5)
+
+    thread = threading.Thread(target=render_slow)
+    try:
+        thread.start()
+        # renders in the other worker outlive the timeout of the slow one
+        for _ in range(10):
+            assert rendering.render_pool.render("*a*", 5) == "<p><em>a</em></p>"
+            time.sleep(0.1)
+        thread.join()
+        assert results["slow"] == f"<p>{slow}</p>"
+    finally:
+        rendering.render_pool.terminate()
+
+
+def test_render_timeout_excludes_wait(monkeypatch):
+    monkeypatch.setattr(rendering.render_pool, "processes", 1)
+    slow = "`" * 2000
+    thread = threading.Thread(
+        target=rendering.render_within_budget, args=(slow,), kwargs={"timeout": 0.5}
+    )
+    try:
+        thread.start()
+        time.sleep(0.1)
+        # waits for the only worker longer than its own timeout
+        assert rendering.render_pool.render("*a*", 0.3) == "<p><em>a</em></p>"
+        thread.join()
+    finally:
+        rendering.render_pool.terminate()
+
+
+def test_make_excerpt():
+    paragraph = "<p>{}</p>\n".format("x" * 40)
+    assert rendering.make_excerpt(paragraph * 2, max_length=100) is None
+    # cut between top-level blocks only
+    excerpt = rendering.make_excerpt(paragraph * 5, max_length=100)
+    assert excerpt == (paragraph * 2).rstrip()
+    # at least one block, no matter how long
+    nested = "<ul>\n<li><p>{}</p></li>\n<li>b<br>c</li>\n</ul>".format("y" * 200)
+    assert rendering.make_excerpt(nested + "\n" + paragraph, max_length=100) == nested
+    quoted = '<p><a href="/" title="a > b">{}</a></p>\n'.format("z" * 40)
+    excerpt = rendering.make_excerpt(quoted * 3, max_length=100)
+    assert excerpt == (quoted * 2).rstrip()
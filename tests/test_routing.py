@@ -0,0 +1,118 @@
+import shutil
+import sqlite3
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from dailypush import create_app, db, init_db
+from dailypush.models import User, Topic, Post
+
+
+@pytest.fixture
+def replicated_app(tmp_path):
+    """App with a primary and two replica SQLite files, replicated once."""
+    primary = tmp_path / "primary.db"
+    replicas = [tmp_path / "replica_a.db", tmp_path / "replica_b.db"]
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+            "SQLALCHEMY_BINDS": {
+                "replica_a": f"sqlite:///{replicas[0]}",
+                "replica_b": f"sqlite:///{replicas[1]}",
+            },
+            "DATABASE_REPLICAS": ["replica_a", "replica_b"],
+            # every request should reach the database
+            "PAGE_CACHE": None,
+            "WTF_CSRF_ENABLED": False,
+        }
+    )
+    with app.app_context():
+        init_db()
+        user = User(
+            id=1,
+            username="test",
+            hash=generate_password_hash("validUser#1", method="pbkdf2:sha256:1"),
+        )
+        db.session.add(Topic(id=1, name="topic", author=user, is_public=True))
+        db.session.commit()
+        db.engine.dispose()
+    for replica in replicas:
+        shutil.copy(primary, replica)
+    return app
+
+
+def rename_topic(path, name):
+    """Change the topic in one copy of the database only."""
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE topics SET name = ? WHERE id = 1", (name,))
+
+
+def test_reads_from_replicas(replicated_app, tmp_path):
+    rename_topic(tmp_path / "replica_a.db", "topic on a")
+    rename_topic(tmp_path / "replica_b.db", "topic on b")
+    client = replicated_app.test_client()
+
+    # read-only requests alternate between the replicas
+    names = []
+    for _ in range(4):
+        response_text = client.get("/topics?filter=public").text
+        names.append("topic on a" in response_text)
+        assert ("topic on b" in response_text) != names[-1]
+    assert names == [True, False, True, False]
+
+    # work outside of requests uses the primary
+    with replicated_app.app_context():
+        assert db.session.get(Topic, 1).name == "topic"
+
+
+def test_read_your_writes(replicated_app, tmp_path):
+    client = replicated_app.test_client()
+    response = client.post(
+        "/auth/login", data={"username": "test", "password": "validUser#1"}
+    )
+    assert response.status_code == 302
+
+    client.post("/create_topic", data={"name": "new topic", "is_public": "y"})
+    # the new topic isn't on the replicas yet, but the author reads the primary
+    assert "new topic" in client.get("/topics?filter=public").text
+
+    replicated_app.config["DATABASE_REPLICA_STICKINESS"] = 0
+    client.post("/create_topic", data={"name": "newer topic", "is_public": "y"})
+    response_text = client.get("/topics?filter=public").text
+    assert "newer topic" not in response_text
+    assert "new topic" not in response_text
+
+
+def test_writing_session_stays_on_primary(replicated_app, tmp_path):
+    rename_topic(tmp_path / "replica_a.db", "stale")
+    rename_topic(tmp_path / "replica_b.db", "stale")
+    with replicated_app.test_request_context("/"):
+        assert db.session.get(Topic, 1).name == "stale"
+        db.session.add(Topic(name="other", author_id=1))
+        db.session.flush()
+        db.session.expire_all()
+        assert db.session.get(Topic, 1).name == "topic"
+        db.session.rollback()
+
+
+def test_cached_pages_read_from_primary(replicated_app, tmp_path):
+    rename_topic(tmp_path / "replica_a.db", "stale")
+    rename_topic(tmp_path / "replica_b.db", "stale")
+    replicated_app.config["PAGE_CACHE"] = "memory"
+    client = replicated_app.test_client()
+    for _ in range(2):
+        response = client.get("/topics?filter=public")
+        assert "stale" not in response.text
+    assert response.headers["X-Cache"] == "HIT"
+
+
+def test_feed_reads_from_primary(replicated_app):
+    with replicated_app.app_context():
+        # not on the replicas yet
+        db.session.add(Post(title="fresh post", body="body", topic_id=1))
+        db.session.commit()
+    replicated_app.config["DATABASE_REPLICA_STICKINESS"] = 0
+    client = replicated_app.test_client()
+    client.post("/auth/login", data={"username": "test", "password": "validUser#1"})
+    assert "fresh post" in client.get("/").text
@@ -0,0 +1,170 @@
+from sqlalchemy.dialects import mysql
+
+from dailypush import db
+from dailypush.models import Topic, Post
+from dailypush.search import (
+    LikeIndex,
+    MySQLFulltextIndex,
+    get_search_index,
+    search_terms,
+)
+
+
+def search_titles(app, text, model=Post):
+    with app.app_context():
+        select = get_search_index().search(db.select(model), model, text)
+        return [str(obj) for obj in db.session.execute(select).unique().scalars()]
+
+
+def test_search_terms():
+    assert search_terms('"public" AND (post*) -NEAR') == [
+        "public",
+        "AND",
+        "post",
+        "NEAR",
+    ]
+    assert search_terms("  ?! ") == []
+
+
+def test_search_visibility(client, auth):
+    # visitors only find posts in public topics
+    response = client.get("/search?q=title")
+    assert "public post title" in response.text
+    assert "test title" not in response.text
+
+    # logged in users find their own private posts too
+    auth.login()
+    response = client.get("/search?q=title")
+    assert "public post title" in response.text
+    assert "test title" in response.text
+
+    # but not private posts of others
+    auth.logout()
+    auth.login("other", "validUser#2")
+    response = client.get("/search?q=test")
+    assert "test title" not in response.text
+    assert "No posts match the search." in response.text
+
+
+def test_search_topics(client, auth):
+    response = client.get("/search?q=topic")
+    assert "public topic" in response.text
+    assert "other topic" not in response.text
+
+    auth.login("other", "validUser#2")
+    response = client.get("/search?q=topic")
+    assert "public topic" in response.text
+    assert "other topic" in response.text
+    assert "test topic" not in response.text
+
+
+def test_search_ranking(app):
+    with app.app_context():
+        topic = db.session.get(Topic, 3)
+        db.session.add_all(
+            [
+                Post(title="cats", body="a post about dogs", topic=topic),
+                Post(title="dogs", body="dogs, dogs and more dogs", topic=topic),
+            ]
+        )
+        db.session.commit()
+
+    assert search_titles(app, "dogs") == ["dogs", "cats"]
+    # every word must match
+    assert search_titles(app, "dogs more") == ["dogs"]
+
+
+def test_search_syntax_is_ignored(client):
+    response = client.get('/search?q="public" (post* -body')
+    assert response.status_code == 200
+    assert "public post title" in response.text
+
+    response = client.get("/search?q=?!")
+    assert response.status_code == 200
+    assert "No posts match the search." in response.text
+
+
+def test_search_pagination(app, client, monkeypatch):
+    monkeypatch.setattr("dailypush.constants.SEARCH_RESULTS_PER_PAGE", 2)
+    with app.app_context():
+        topic = db.session.get(Topic, 3)
+        db.session.add_all(
+            [Post(title=f"page {i}", body="paginated", topic=topic) for i in range(3)]
+        )
+        db.session.commit()
+
+    response = client.get("/search?q=paginated")
+    assert response.text.count('class="card mb-3 post"') == 2
+    assert "/search?q=paginated&amp;page=2" in response.text
+    response = client.get("/search?q=paginated&page=2")
+    assert response.text.count('class="card mb-3 post"') == 1
+
+
+def test_index_follows_changes(app):
+    with app.app_context():
+        post = db.session.get(Post, 2)
+        post.title = "renamed"
+        post.body = "brand new words"
+        db.session.commit()
+    assert search_titles(app, "public") == []
+    assert search_titles(app, "brand words") == ["renamed"]
+
+    with app.app_context():
+        # only the title changes, the deferred body isn't even loaded
+        db.session.get(Post, 2).title = "renamed again"
+        db.session.commit()
+    assert search_titles(app, "brand") == ["renamed again"]
+
+    with app.app_context():
+        db.session.delete(db.session.get(Post, 2))
+        db.session.commit()
+    assert search_titles(app, "brand") == []
+
+
+def test_index_follows_deleted_topic(app):
+    with app.app_context():
+        db.session.delete(db.session.get(Topic, 1))
+        db.session.commit()
+        rows = db.session.execute(db.text("SELECT rowid FROM posts_fts")).all()
+    assert rows == [(2,)]
+    assert search_titles(app, "test", Topic) == []
+
+
+def test_reindex_search(app, runner):
+    with app.app_context():
+        # bypasses the ORM events
+        db.session.execute(
+            db.update(Post).where(Post.id == 2).values(title="bulk updated")
+        )
+        db.session.commit()
+    assert search_titles(app, "bulk") == []
+
+    result = runner.invoke(args=["reindex-search"])
+    assert "Rebuilt the search index." in result.output
+    assert search_titles(app, "bulk") == ["bulk updated"]
+
+
+def test_like_index(app):
+    index = LikeIndex()
+    with app.app_context():
+        select = index.search(db.select(Post), Post, "post 100%")
+        assert db.session.execute(select).scalars().all() == []
+        select = index.search(db.select(Post), Post, "POST body")
+        assert [post.id for post in db.session.execute(select).scalars()] == [2]
+
+
+def test_mysql_index_requires_every_word():
+    condition = MySQLFulltextIndex().condition(Post, '"public" -post*')
+    sql = condition.compile(
+        dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    assert str(sql) == (
+        "MATCH (posts.title, posts.body) AGAINST ('+public +post' IN BOOLEAN MODE)"
+    )
+
+
+def test_admin_body_filter(client, auth):
+    auth.login("john", "validUser#3")
+    response = client.get("/admin/post/?flt0_0=public")
+    assert "public post title" in response.text
+    assert "test title" not in response.text
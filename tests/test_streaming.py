@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+
+from dailypush import db
+from dailypush.instrumentation import collect_queries
+from dailypush.models import Post
+
+
+@pytest.fixture
+def many_posts(app):
+    with app.app_context():
+        db.session.add_all(
+            Post(title=f"post {i}", body=f"body {i}", topic_id=1) for i in range(20)
+        )
+        db.session.commit()
+
+
+def render(app, client, path, stream, **kwargs):
+    app.config["STREAM_PAGES"] = stream
+    return client.get(path, **kwargs)
+
+
+@pytest.mark.parametrize("pagination", ("count", "keyset"))
+@pytest.mark.parametrize("path", ("/", "/topics/1", "/topics/1?page=2"))
+def test_same_page_streamed(app, client, auth, many_posts, pagination, path):
+    app.config["TOPIC_PAGINATION"] = pagination
+    auth.login()
+    if pagination == "keyset" and path.endswith("page=2"):
+        # the link to older posts, from the first page
+        page = render(app, client, "/topics/1", False).text
+        path = "/topics/1?after=" + page.split("?after=")[1].split('"')[0]
+
+    rendered = render(app, client, path, False)
+    streamed = render(app, client, path, True)
+    # streamed responses have no length up front
+    assert "Content-Length" in rendered.headers
+    assert "Content-Length" not in streamed.headers
+    assert streamed.text == rendered.text
+    if path != "/":
+        assert "Newer" in streamed.text or "Older" in streamed.text
+
+
+def test_header_sent_before_posts(app, client, auth, many_posts):
+    auth.login()
+    app.config["STREAM_PAGES"] = True
+    with collect_queries() as stats:
+        response = client.get("/topics/1", buffered=False)
+        try:
+            chunks = iter(response.response)
+            first = next(chunks)
+            assert b"</nav>" in first
+            assert b"post-body" not in first
+            # posts are fetched while the page is sent
+            assert not any("FROM posts" in statement for statement in stats.statements)
+            rest = b"".join(chunks)
+        finally:
+            response.close()
+    assert any("FROM posts" in statement for statement in stats.statements)
+    assert rest.count(b'class="card mb-3 post"') == 15
+
+
+def test_gzipped_stream(app, client, auth):
+    auth.login()
+    rendered = render(app, client, "/topics/1", False)
+    streamed = render(
+        app, client, "/topics/1", True, headers={"Accept-Encoding": "gzip"}
+    )
+    assert streamed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in streamed.vary
+    assert gzip.decompress(streamed.data).decode() == rendered.text
+
+
+def test_cached_pages_not_streamed(app, client):
+    app.config["STREAM_PAGES"] = True
+    response = client.get("/topics/3")
+    assert "Content-Length" in response.headers
+    assert response.headers["X-Cache"] == "MISS"
+    assert client.get("/topics/3").headers["X-Cache"] == "HIT"
+
+    app.config["PAGE_CACHE"] = None
+    app.extensions.pop("page_cache")
+    assert "Content-Length" not in client.get("/topics/3").headers
+
+
+def test_streamed_page_out_of_range(app, client, auth):
+    auth.login()
+    app.config["STREAM_PAGES"] = True
+    assert client.get("/topics/1?page=2").status_code == 404
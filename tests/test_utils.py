@@ -1,6 +1,6 @@
 import pytest
 
-from dailypush.utils import multireplace
+from dailypush.utils import LRUCache, Replacer, get_replacer, multireplace
 
 
 @pytest.mark.parametrize(
@@ -9,7 +9,65 @@ from dailypush.utils import multireplace
         ("The Lord of the Rings", {"the": "a"}, True, "a Lord of a Rings"),
         ("The Lord of the Rings", {"the": "a"}, False, "The Lord of a Rings"),
         ("The Lord of the Rings", {}, True, "The Lord of the Rings"),
+        ("hey abc", {"ab": "AB", "abc": "ABC"}, False, "hey ABC"),
+        ("<H1>Title</h1>", {"<h1>": "<h5>", "</H1>": "</h5>"}, True, "<h5>Title</h5>"),
     ),
 )
 def test_multireplace(text, replacements, ignore_case, text_replaced):
     assert text_replaced == multireplace(text, replacements, ignore_case)
+
+
+def test_replacer():
+    replacer = Replacer({"a": "1", "b": "2"})
+    assert replacer.replace("abc") == "12c"
+    assert replacer("cab") == "c12"
+    assert Replacer({}).replace("abc") == "abc"
+    # too many spellings to precompute
+    replacer = Replacer({"abcdefghijkl": "x"}, ignore_case=True)
+    assert replacer.replace("-AbCdEfGhIjKl-abcdefghijkl-") == "-x-x-"
+
+
+def test_get_replacer():
+    assert get_replacer({"a": "1"}) is get_replacer({"a": "1"})
+    assert get_replacer({"a": "1"}) is not get_replacer({"a": "1"}, ignore_case=True)
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is now the least recently used entry
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 1,
+        "size": 2,
+        "maxsize": 2,
+    }
+
+    cache.resize(1)
+    assert len(cache) == 1
+    assert cache.get("c") == 3
+
+    cache.resize(0)
+    cache.set("d", 4)
+    assert len(cache) == 0
+
+
+def test_lru_cache_ttl(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("dailypush.utils.time.monotonic", lambda: now)
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    now = 109.0
+    assert cache.get("a") == 1
+    now = 110.0
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert len(cache) == 0